@@ -1,5 +1,6 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
+import json
 import re
 from pathlib import Path
 
@@ -11,6 +12,13 @@ from jupyter_releaser import util
 START_MARKER = "<!-- <START NEW CHANGELOG ENTRY> -->"
 END_MARKER = "<!-- <END NEW CHANGELOG ENTRY> -->"
 PR_PREFIX = "Automated Changelog Entry"
+PR_INDEX_NAME = "jupyter-releaser-pr-index.json"
+
+BACKPORT_PATTERN = r"Backport PR #(\d+)"
+CHERRY_PICK_PATTERN = r"\(cherry picked from commit ([0-9a-f]{7,40})\)"
+MERGE_PATTERN = r"^Merge pull request #(\d+) from "
+SQUASH_PATTERN = r"^(.*) \(#(\d+)\)$"
+NOREPLY_PATTERN = r"^(?:\d+\+)?([^@]+)@users\.noreply\.github\.com$"
 
 
 def format_pr_entry(target, number, auth=None):
@@ -40,6 +48,102 @@ def format_pr_entry(target, number, auth=None):
     return f"- {title} [#{number}]({url}) ([@{user_name}]({user_url}))"
 
 
+def load_pr_index():
+    """Load the cached PR entry index stored in the git directory"""
+    path = Path(util.run("git rev-parse --git-dir", quiet=True)) / PR_INDEX_NAME
+    if not path.exists():
+        return dict()
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        util.log(f"Ignoring invalid PR index {path}")
+        return dict()
+
+
+def save_pr_index(index):
+    """Save the cached PR entry index to the git directory"""
+    path = Path(util.run("git rev-parse --git-dir", quiet=True)) / PR_INDEX_NAME
+    path.write_text(json.dumps(index, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def get_backport_index(revision_range, repo):
+    """Map backported PR numbers to original PR entries using git history.
+
+    Backport commits are found by their `Backport PR #N` subject and
+    `(cherry picked from commit ...)` trailer.  The original commit is
+    looked up locally to find the PR title and author.  The author is only
+    taken from the GitHub noreply email of a squashed or rebased commit, so
+    backports of merge commits are left to the cache or the API.
+
+    Parameters
+    ----------
+    revision_range : str
+        The git revision range to search, e.g. `v1.0.0..origin/main`
+    repo : str
+        The GitHub owner/repo
+
+    Returns
+    -------
+    dict
+        A mapping of PR number to formatted PR entry
+    """
+    log = util.run(f"git log --format=%s%x00%b%x1e {revision_range}", quiet=True)
+
+    backports = dict()
+    for record in log.split("\x1e"):
+        if "\x00" not in record:
+            continue
+        subject, body = record.strip().split("\x00", 1)
+        match = re.search(BACKPORT_PATTERN, subject)
+        if not match:
+            continue
+        number = match.groups()[0]
+        picked = re.search(CHERRY_PICK_PATTERN, body)
+        # Fall back on the backport subject for the title
+        title = re.sub(rf".*{BACKPORT_PATTERN}:?\s*", "", subject).strip()
+        backports[number] = dict(sha=picked and picked.groups()[0], title=title)
+
+    shas = " ".join(b["sha"] for b in backports.values() if b["sha"])
+    originals = dict()
+    if shas:
+        log = util.run(
+            f"git log --no-walk --ignore-missing --format=%H%x00%ae%x00%s%x00%b%x1e {shas}",
+            quiet=True,
+        )
+        for record in log.split("\x1e"):
+            if record.count("\x00") < 3:
+                continue
+            sha, email, subject, body = record.strip().split("\x00", 3)
+            originals[sha] = (email, subject, body)
+
+    index = dict()
+    for (number, backport) in backports.items():
+        login = None
+        title = backport["title"]
+        original = None
+        for (sha, value) in originals.items():
+            if backport["sha"] and sha.startswith(backport["sha"]):
+                original = value
+        if original:
+            email, subject, body = original
+            squash = re.match(SQUASH_PATTERN, subject)
+            noreply = re.match(NOREPLY_PATTERN, email)
+            # The author of a merge commit is whoever merged the PR, and the
+            # owner in its subject is the owner of the head repo, so neither
+            # identifies the PR author
+            if noreply and not re.match(MERGE_PATTERN, subject):
+                login = noreply.groups()[0]
+            if squash and squash.groups()[1] == number:
+                title = squash.groups()[0]
+        if not login or not title:
+            continue
+        url = f"https://github.com/{repo}/pull/{number}"
+        user_url = f"https://github.com/{login}"
+        index[number] = f"- {title} [#{number}]({url}) ([@{login}]({user_url}))"
+
+    return index
+
+
 def get_version_entry(branch, repo, version, *, auth=None, resolve_backports=False):
     """Get a changelog for the changes since the last tag on the given branch.
 
@@ -54,18 +158,19 @@ def get_version_entry(branch, repo, version, *, auth=None, resolve_backports=Fal
     auth : str, optional
         The GitHub authorization token
     resolve_backports: bool, optional
-        Whether to resolve backports to the original PR
+        Whether to resolve backports to the original PR, using local git
+        history and the cached PR index before falling back on the API
 
     Returns
     -------
     str
         A formatted changelog entry with markers
     """
-    tags = util.run(f"git --no-pager tag --sort=-creatordate --merged {branch}")
-    if not tags:  # pragma: no cover
+    since = util.get_tag_index().latest(branch)
+    if since is None:  # pragma: no cover
         raise ValueError(f"No tags found on branch {branch}")
 
-    since = tags.splitlines()[0]
+    revision_range = f"{since}..{branch}"
     branch = branch.split("/")[-1]
     util.log(f"Getting changes to {repo} since {since} on branch {branch}...")
 
@@ -81,11 +186,8 @@ def get_version_entry(branch, repo, version, *, auth=None, resolve_backports=Fal
 
     entry = entry.splitlines()[2:]
 
-    for (ind, line) in enumerate(entry):
-        if re.search(r"\[@meeseeksmachine\]", line) is not None:
-            match = re.search(r"Backport PR #(\d+)", line)
-            if match:
-                entry[ind] = format_pr_entry(repo, match.groups()[0])
+    if resolve_backports:
+        entry = resolve_backport_entries(entry, revision_range, repo, auth)
 
     # Remove github actions PRs
     gh_actions = "[@github-actions](https://github.com/github-actions)"
@@ -111,6 +213,40 @@ def get_version_entry(branch, repo, version, *, auth=None, resolve_backports=Fal
     return output
 
 
+def resolve_backport_entries(entry, revision_range, repo, auth=None):
+    """Replace backport PR lines with the entries for their original PRs.
+
+    Entries are resolved from local git history first, then from the
+    cached PR index, and only misses are fetched from the GitHub API.
+    """
+    lines = list(entry)
+    numbers = dict()
+    for (ind, line) in enumerate(lines):
+        if re.search(r"\[@meeseeksmachine\]", line) is None:
+            continue
+        match = re.search(BACKPORT_PATTERN, line)
+        if match:
+            numbers[ind] = match.groups()[0]
+
+    if not numbers:
+        return lines
+
+    pr_index = load_pr_index()
+    cached = pr_index.setdefault(repo, dict())
+    local = get_backport_index(revision_range, repo)
+
+    for (ind, number) in numbers.items():
+        if number in local:
+            cached[number] = local[number]
+        elif number not in cached:
+            util.log(f"Fetching backported PR #{number} from {repo}")
+            cached[number] = format_pr_entry(repo, number, auth=auth)
+        lines[ind] = cached[number]
+
+    save_pr_index(pr_index)
+    return lines
+
+
 def build_entry(branch, repo, auth, changelog_path, resolve_backports):
     """Build a python version entry"""
     repo = repo or util.get_repo()
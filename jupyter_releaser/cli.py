@@ -46,6 +46,9 @@ class ReleaseHelperGroup(click.Group):
                 raise ValueError("Please run prep-git first")
             os.chdir(util.CHECKOUT_NAME)
 
+        # Tags may have changed since the last command
+        util.clear_tag_index()
+
         # Read in the config
         config = util.read_config()
         hooks = config.get("hooks", {})
@@ -141,6 +144,15 @@ dist_dir_options = [
     )
 ]
 
+venv_cache_options = [
+    click.option(
+        "--venv-cache",
+        envvar="RH_VENV_CACHE",
+        default="~/.cache/jupyter-releaser-venv",
+        help="The cache dir for venv templates and build environments",
+    )
+]
+
 dry_run_options = [
     click.option(
         "--dry-run", is_flag=True, envvar="RH_DRY_RUN", help="Run as a dry run"
@@ -256,13 +268,21 @@ def check_changelog(branch, repo, auth, changelog_path, resolve_backports, outpu
 
 @main.command()
 @add_options(dist_dir_options)
+@add_options(venv_cache_options)
+@click.option(
+    "--cache-build-env",
+    is_flag=True,
+    envvar="RH_CACHE_BUILD_ENV",
+    help="Build in a cached environment instead of a new isolated one",
+)
 @use_checkout_dir()
-def build_python(dist_dir):
+def build_python(dist_dir, venv_cache, cache_build_env):
     """Build Python dist files"""
     if not util.PYPROJECT.exists() and not util.SETUP_PY.exists():
         util.log("Skipping build-python since there are no python package files")
         return
-    python.build_dist(dist_dir)
+    cache_dir = venv_cache if cache_build_env else None
+    python.build_dist(dist_dir, cache_dir=cache_dir)
 
 
 @main.command()
@@ -272,26 +292,50 @@ def build_python(dist_dir):
     envvar="RH_PY_TEST_COMMAND",
     help="The command to run in the test venvs",
 )
+@add_options(venv_cache_options)
+@click.option(
+    "--interpreter",
+    envvar="RH_PY_INTERPRETERS",
+    multiple=True,
+    default=["python"],
+    help="The python interpreters to check with",
+)
 @use_checkout_dir()
-def check_python(dist_dir, test_cmd):
+def check_python(dist_dir, test_cmd, venv_cache, interpreter):
     """Check Python dist files"""
+    dist_files = []
     for dist_file in glob(f"{dist_dir}/*"):
         if Path(dist_file).suffix not in [".gz", ".whl"]:
             util.log(f"Skipping non-python dist file {dist_file}")
             continue
-        python.check_dist(dist_file, test_cmd=test_cmd)
+        dist_files.append(dist_file)
+    python.check_dists(
+        dist_files, test_cmd=test_cmd, cache_dir=venv_cache, pythons=interpreter
+    )
 
 
 @main.command()
 @add_options(dist_dir_options)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Report workspace packages that are unchanged since the last release",
+)
+@click.option(
+    "--skip-unchanged",
+    is_flag=True,
+    help="Skip packing workspace packages that are unchanged since the last release",
+)
 @click.argument("package", default=".")
 @use_checkout_dir()
-def build_npm(package, dist_dir):
+def build_npm(package, dist_dir, incremental, skip_unchanged):
     """Build npm package"""
     if not osp.exists("./package.json"):
         util.log("Skipping check-npm since there is no package.json file")
         return
-    npm.build_dist(package, dist_dir)
+    npm.build_dist(
+        package, dist_dir, incremental=incremental, skip_unchanged=skip_unchanged
+    )
 
 
 @main.command()
@@ -301,21 +345,45 @@ def build_npm(package, dist_dir):
     envvar="RH_NPM_TEST_COMMAND",
     help="The command to run in isolated install.",
 )
+@click.option(
+    "--npm-cache",
+    envvar="RH_NPM_CACHE",
+    default="~/.cache/jupyter-releaser-npm",
+    help="The cache dir for isolated installs",
+)
+@click.option(
+    "--direct-install",
+    is_flag=True,
+    help="Install the tarballs directly instead of extracting them first",
+)
+@click.option(
+    "--shards",
+    default=0,
+    type=click.IntRange(min=0),
+    help="The number of isolated installs to check packages in parallel",
+)
 @use_checkout_dir()
-def check_npm(dist_dir, test_cmd):
+def check_npm(dist_dir, test_cmd, npm_cache, direct_install, shards):
     """Check npm package"""
     if not osp.exists("./package.json"):
         util.log("Skipping check-npm since there is no package.json file")
         return
-    npm.check_dist(dist_dir, test_cmd=test_cmd)
+    npm.check_dist(
+        dist_dir,
+        test_cmd=test_cmd,
+        cache_dir=npm_cache,
+        direct_install=direct_install,
+        shards=shards,
+    )
 
 
 @main.command()
+@add_options(dist_dir_options)
 @use_checkout_dir()
-def check_manifest():
+def check_manifest(dist_dir):
     """Check the project manifest"""
     if util.PYPROJECT.exists() or util.SETUP_PY.exists():
-        util.run("check-manifest -v")
+        python.check_manifest(dist_dir)
     else:
         util.log("Skipping check-manifest since there are no python package files")
 
@@ -349,10 +417,15 @@ def check_manifest():
     envvar="RH_LINKS_EXPIRE",
     help="Duration in seconds for links to be cached (default one week)",
 )
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only check links in files changed since the last release, and expired links",
+)
 @use_checkout_dir()
-def check_links(ignore_glob, ignore_links, cache_file, links_expire):
+def check_links(ignore_glob, ignore_links, cache_file, links_expire, incremental):
     """Check URLs for HTML-containing files."""
-    lib.check_links(ignore_glob, ignore_links, cache_file, links_expire)
+    lib.check_links(ignore_glob, ignore_links, cache_file, links_expire, incremental)
 
 
 @main.command()
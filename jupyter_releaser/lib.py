@@ -11,11 +11,11 @@ from glob import glob
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
-import requests
 from ghapi.core import GhApi
 from pkg_resources import parse_version
 
 from jupyter_releaser import changelog
+from jupyter_releaser import links
 from jupyter_releaser import npm
 from jupyter_releaser import python
 from jupyter_releaser import util
@@ -35,7 +35,7 @@ def bump_version(version_spec, version_cmd):
 
     # Bail if tag already exists
     tag_name = f"v{version}"
-    if tag_name in util.run("git --no-pager tag").splitlines():
+    if tag_name in util.get_tag_index():
         msg = f"Tag {tag_name} already exists!"
         msg += " To delete run: `git push --delete origin {tag_name}`"
         raise ValueError(msg)
@@ -43,36 +43,25 @@ def bump_version(version_spec, version_cmd):
     return version
 
 
-def check_links(ignore_glob, ignore_links, cache_file, links_expire):
+def check_links(ignore_glob, ignore_links, cache_file, links_expire, incremental=False):
     """Check URLs for HTML-containing files."""
     cache_dir = osp.expanduser(cache_file).replace(os.sep, "/")
     os.makedirs(cache_dir, exist_ok=True)
-    cmd = "pytest --noconftest --check-links --check-links-cache "
-    cmd += f"--check-links-cache-expire-after {links_expire} "
-    cmd += f"--check-links-cache-name {cache_dir}/check-release-links "
 
-    ignored = []
+    ignored = set()
     for spec in ignore_glob:
-        cmd += f" --ignore-glob {spec}"
-        ignored.extend(glob(spec, recursive=True))
-
-    for spec in ignore_links:
-        cmd += f" --check-links-ignore {spec}"
-
-    cmd += " --ignore node_modules"
+        ignored.update(glob(spec, recursive=True))
 
     # Gather all of the markdown, RST, and ipynb files
-    files = []
-    for ext in [".md", ".rst", ".ipynb"]:
-        matched = glob(f"**/*{ext}", recursive=True)
-        files.extend(m for m in matched if not m in ignored)
+    files = links.find_files(ignored)
 
-    cmd += " " + " ".join(files)
+    changed = None
+    if incremental:
+        changed = links.get_changed_files()
+        if changed is None:
+            util.log("No previous release tag found, checking all files")
 
-    try:
-        util.run(cmd)
-    except Exception:
-        util.run(cmd + " --lf")
+    links.check_links(files, ignore_links, cache_dir, links_expire, changed=changed)
 
 
 def draft_changelog(version_spec, branch, repo, auth, dry_run):
@@ -81,8 +70,7 @@ def draft_changelog(version_spec, branch, repo, auth, dry_run):
     branch = branch or util.get_branch()
     version = util.get_version()
 
-    tags = util.run("git --no-pager tag")
-    if f"v{version}" in tags.splitlines():
+    if f"v{version}" in util.get_tag_index():
         raise ValueError(f"Tag v{version} already exists")
 
     # Check out any unstaged files from version bump
@@ -158,7 +146,7 @@ def tag_release(branch, repo, dist_dir, no_git_tag_workspace):
 
     # Create the annotated release tag
     tag_name = f"v{version}"
-    util.run(f'git tag {tag_name} -a -m "Release {tag_name}"')
+    util.create_tag(tag_name, f"Release {tag_name}")
 
     # Create annotated release tags for workspace packages if given
     if not no_git_tag_workspace:
@@ -213,7 +201,7 @@ def draft_release(
     if not dry_run:
         remote_url = util.run("git config --get remote.origin.url")
         if not os.path.exists(remote_url):
-            util.run(f"git push origin HEAD:{branch} --follow-tags --tags")
+            push_release(branch)
 
     util.log(f"Creating release for {version}")
     util.log(f"With assets: {assets}")
@@ -231,6 +219,14 @@ def draft_release(
     util.actions_output("release_url", release.html_url)
 
 
+def push_release(branch):
+    """Push the new commits and only the tags that point at them"""
+    commits = util.run("git rev-list HEAD --not --remotes=origin", quiet=True)
+    tags = util.get_tag_index().pointing_at(commits.splitlines())
+    refspecs = [f"HEAD:refs/heads/{branch}"] + [f"refs/tags/{tag}" for tag in tags]
+    util.run(f"git push --atomic origin {' '.join(refspecs)}")
+
+
 def delete_release(auth, release_url):
     """Delete a draft GitHub release by url to the release page"""
     match = re.match(util.RELEASE_HTML_PATTERN, release_url)
@@ -260,24 +256,20 @@ def extract_release(auth, dist_dir, dry_run, release_url):
         shutil.rmtree(dist, ignore_errors=True)
     os.makedirs(dist)
 
-    # Fetch, validate, and publish assets
+    # Fetch the assets in parallel
+    headers = dict(Authorization=f"token {auth}", Accept="application/octet-stream")
+    util.download_files([(asset.url, dist / asset.name) for asset in assets], headers)
+
+    # Validate the assets
     for asset in assets:
-        util.log(f"Fetching {asset.name}...")
-        url = asset.url
-        headers = dict(Authorization=f"token {auth}", Accept="application/octet-stream")
         path = dist / asset.name
-        with requests.get(url, headers=headers, stream=True) as r:
-            r.raise_for_status()
-            with open(path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            suffix = Path(asset.name).suffix
-            if suffix in [".gz", ".whl"]:
-                python.check_dist(path)
-            elif suffix == ".tgz":
-                npm.check_dist(path)
-            else:
-                util.log(f"Nothing to check for {asset.name}")
+        suffix = Path(asset.name).suffix
+        if suffix in [".gz", ".whl"]:
+            python.check_dist(path)
+        elif suffix == ".tgz":
+            npm.check_dist(path)
+        else:
+            util.log(f"Nothing to check for {asset.name}")
 
     # Skip sha validation for dry runs since the remote tag will not exist
     if dry_run:
@@ -353,11 +345,14 @@ def publish_release(
             util.run(f"{twine_cmd} {name}", cwd=dist_dir)
             found = True
         elif suffix == ".tgz":
-            util.run(f"{npm_cmd} {name}", cwd=dist_dir)
+            # Published below in dependency order
             found = True
         else:
             util.log(f"Nothing to upload for {name}")
 
+    if glob(f"{dist_dir}/*.tgz"):
+        npm.publish_dist(dist_dir, npm_cmd)
+
     if not found:  # pragma: no cover
         raise ValueError("No assets published, refusing to finalize release")
 
@@ -428,6 +423,7 @@ def prep_git(branch, repo, auth, username, url):
 
     # Make sure we have *all* tags
     util.run("git fetch origin --tags")
+    util.clear_tag_index()
 
     util.run(f"git checkout {branch}")
 
@@ -456,8 +452,7 @@ def forwardport_changelog(
     os.chdir(util.CHECKOUT_NAME)
 
     # Bail if the tag has been merged to the branch
-    tags = util.run(f"git --no-pager tag --merged {branch}")
-    if tag in tags.splitlines():
+    if tag in util.get_tag_index().merged(branch):
         util.log(f"Skipping since tag is already merged into {branch}")
         return
 
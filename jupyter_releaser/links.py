@@ -0,0 +1,324 @@
+# Copyright (c) Jupyter Development Team.
+# Distributed under the terms of the Modified BSD License.
+import asyncio
+import json
+import os
+import os.path as osp
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from subprocess import CalledProcessError
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from jupyter_releaser import util
+
+# The file types that are checked for links
+LINK_EXTENSIONS = [".md", ".rst", ".ipynb"]
+
+# Folders that are never searched for files to check
+PRUNED_DIRS = {"node_modules"}
+
+# Limits on the number of concurrent requests, in total and per host
+MAX_CONNECTIONS = 32
+MAX_PER_HOST = 4
+
+# Failed links are retried after a delay
+LINK_RETRIES = 2
+RETRY_DELAY = 1
+
+# Rate limited links are retried after the delay given by the host,
+# up to a maximum
+MAX_RETRY_AFTER = 60
+
+LINK_TIMEOUT = 30
+
+CACHE_NAME = "check-release-links.json"
+
+# The links found in each file, for incremental checks
+INDEX_NAME = "check-release-links-index.json"
+
+
+def check_links(
+    files, ignore_links=None, cache_dir=None, links_expire=604800, changed=None
+):
+    """Check the links in a set of markdown, rst, and notebook files.
+
+    Links are deduplicated across the files and checked concurrently.
+    Links that match one of the `ignore_links` patterns are skipped, and
+    links that passed within `links_expire` seconds are not checked again.
+    Raises a ValueError listing the broken links.
+
+    If a set of `changed` files is given, the links in the other files are
+    read from the index in `cache_dir`, and only the links in changed files
+    and links whose cached result has expired are checked.
+    """
+    ignore = [re.compile(pattern) for pattern in ignore_links or []]
+    index = load_json(cache_dir, INDEX_NAME)
+    urls = dict()
+    forced = set()
+    errors = []
+    for path in files:
+        stat = os.stat(path)
+        signature = [stat.st_mtime, stat.st_size]
+        entry = index.get(str(path))
+        is_changed = changed is None or osp.normpath(path) in changed
+        if is_changed or not entry or entry["stat"] != signature:
+            entry = index[str(path)] = dict(stat=signature, links=get_links(path))
+        for url in entry["links"]:
+            if any(pattern.match(url) for pattern in ignore):
+                continue
+            if ":" in url:
+                urls.setdefault(url, []).append(str(path))
+                if changed is not None and is_changed:
+                    forced.add(url)
+                continue
+            error = check_local_link(path, url)
+            if error:
+                errors.append(f"{url} in {path}: {error}")
+
+    # Drop files that no longer exist from the index
+    index = {path: entry for (path, entry) in index.items() if osp.exists(path)}
+    save_json(cache_dir, INDEX_NAME, index)
+
+    cache = load_cache(cache_dir, links_expire)
+    pending = sorted(url for url in urls if url in forced or url not in cache)
+    util.log(
+        f"Checking {len(pending)} of {len(urls)} links in {len(files)} files "
+        f"({len(urls) - len(pending)} cached)"
+    )
+
+    now = time.time()
+    failed = asyncio.run(check_urls(pending))
+    for _ in range(LINK_RETRIES):
+        if not failed:
+            break
+        time.sleep(RETRY_DELAY)
+        util.log(f"Retrying {len(failed)} failed links")
+        failed = asyncio.run(check_urls(sorted(failed)))
+
+    for url in pending:
+        if url not in failed:
+            cache[url] = now
+    save_json(cache_dir, CACHE_NAME, cache)
+
+    for url, error in sorted(failed.items()):
+        errors.append(f"{url} in {', '.join(urls[url])}: {error}")
+    if errors:
+        raise ValueError("Broken links:\n" + "\n".join(errors))
+    util.log("All links passed")
+
+
+def find_files(ignored=None, root="."):
+    """Find the files to check for links in a single pass.
+
+    Hidden folders, `node_modules`, and `ignored` folders are pruned
+    before they are searched.
+    """
+    ignored = {osp.normpath(path) for path in ignored or []}
+    extensions = tuple(LINK_EXTENSIONS)
+    files = []
+    pending = [root]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                path = osp.normpath(entry.path)
+                if path in ignored:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in PRUNED_DIRS:
+                        pending.append(entry.path)
+                elif entry.name.endswith(extensions):
+                    files.append(path)
+    return sorted(files)
+
+
+def get_links(path):
+    """Get the http and relative link targets in a file"""
+    import html5lib
+
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".ipynb":
+        from nbconvert.filters import markdown2html
+
+        cells = json.loads(text).get("cells", [])
+        sources = [c["source"] for c in cells if c.get("cell_type") == "markdown"]
+        sources = ["".join(s) if isinstance(s, list) else s for s in sources]
+        htmls = [markdown2html(source) for source in sources]
+    elif path.suffix == ".rst":
+        from docutils.core import publish_parts
+
+        parts = publish_parts(
+            text,
+            source_path=str(path),
+            writer_name="html",
+            settings_overrides=dict(report_level=5),
+        )
+        htmls = [parts["html_body"]]
+    else:
+        from nbconvert.filters import markdown2html
+
+        htmls = [markdown2html(text)]
+
+    links = []
+    for html in htmls:
+        parsed = html5lib.parse(html, namespaceHTMLElements=False)
+        for element in parsed.iter():
+            if element.tag == "a":
+                url = element.get("href")
+            elif element.tag in ["img", "iframe"]:
+                url = element.get("src")
+            else:
+                continue
+            if not url or url.startswith("#"):
+                continue
+            # Ignore non-http links (mailto:, data:, etc.)
+            if ":" in url and url.split(":", 1)[0].lower() not in ["http", "https"]:
+                continue
+            links.append(url)
+    return links
+
+
+def check_local_link(path, url):
+    """Check a relative link, returning an error message if it is broken"""
+    if url.startswith("/"):
+        return "absolute path link"
+    url = url.split("?")[0].split("#")[0]
+    if not url:
+        return None
+    url_path = unquote(url).replace("/", os.sep)
+    dirpath = Path(path).parent
+    for ext in LINK_EXTENSIONS + [".html"]:
+        if dirpath.joinpath(url_path.replace(".html", ext)).exists():
+            return None
+    return f"No such file: {dirpath.joinpath(url_path)}"
+
+
+async def check_urls(urls):
+    """Check URLs concurrently, returning the errors by URL.
+
+    Each host gets its own connection pool and concurrency limit.
+    """
+    loop = asyncio.get_running_loop()
+    total = asyncio.Semaphore(MAX_CONNECTIONS)
+    hosts = dict()
+    errors = dict()
+    executor = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS)
+
+    async def check(url):
+        host = urlsplit(url).netloc.lower()
+        if host not in hosts:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_PER_HOST)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = "jupyter-releaser"
+            hosts[host] = (asyncio.Semaphore(MAX_PER_HOST), session)
+        limit, session = hosts[host]
+        async with total, limit:
+            error = await loop.run_in_executor(executor, fetch_url, session, url)
+        if error:
+            errors[url] = error
+
+    try:
+        await asyncio.gather(*(check(url) for url in urls))
+    finally:
+        executor.shutdown()
+        for (_, session) in hosts.values():
+            session.close()
+    return errors
+
+
+def fetch_url(session, url):
+    """Fetch a URL without reading the body, returning an error message.
+
+    Rate limited requests are retried after the `Retry-After` delay.
+    """
+    for attempt in range(LINK_RETRIES + 1):
+        try:
+            with session.get(url.split("#")[0], stream=True, timeout=LINK_TIMEOUT) as r:
+                if r.status_code < 400:
+                    return None
+                error = f"{r.status_code}: {r.reason}"
+                delay = get_retry_after(r)
+        except requests.RequestException as e:
+            return str(e)
+        if delay is None or attempt == LINK_RETRIES:
+            return error
+        util.log(f"Rate limited by {urlsplit(url).netloc}, retrying in {delay}s")
+        time.sleep(delay)
+
+
+def get_retry_after(response):
+    """Get the delay in seconds before retrying a rate limited response.
+
+    Returns None if the response is not rate limited.
+    """
+    if response.status_code not in [429, 503]:
+        return None
+    value = response.headers.get("Retry-After")
+    if response.status_code == 503 and not value:
+        return None
+    delay = RETRY_DELAY
+    if value and value.strip().isdigit():
+        delay = int(value)
+    elif value:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            pass
+    return min(max(delay, 0), MAX_RETRY_AFTER)
+
+
+def get_changed_files(ref="HEAD"):
+    """Get the files changed since the last release tag reachable from a ref.
+
+    Returns None if there is no release tag.
+    """
+    try:
+        tag = util.get_tag_index().latest(ref)
+    except CalledProcessError:
+        return None
+    if tag is None:
+        return None
+    util.log(f"Finding files changed since {tag}")
+    changed = util.run(f"git diff --name-only --relative {tag}", quiet=True)
+    untracked = util.run("git ls-files --others --exclude-standard", quiet=True)
+    paths = changed.splitlines() + untracked.splitlines()
+    return {osp.normpath(path) for path in paths if path}
+
+
+def load_cache(cache_dir, links_expire):
+    """Load the times that links last passed, dropping expired entries"""
+    cache = load_json(cache_dir, CACHE_NAME)
+    now = time.time()
+    return {url: t for (url, t) in cache.items() if now - t < int(links_expire)}
+
+
+def load_json(cache_dir, name):
+    """Load a json file from the cache dir"""
+    if not cache_dir:
+        return dict()
+    path = Path(cache_dir) / name
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return dict()
+
+
+def save_json(cache_dir, name, data):
+    """Save a json file to the cache dir"""
+    if not cache_dir:
+        return
+    path = Path(cache_dir) / name
+    tmp_path = path.with_suffix(".partial")
+    tmp_path.write_text(json.dumps(data, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, path)
@@ -1,67 +1,243 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
+import base64
+import hashlib
 import json
 import os
 import os.path as osp
+import posixpath
+import shlex
 import shutil
 import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 from pathlib import Path
+from subprocess import CalledProcessError
 from tempfile import TemporaryDirectory
 
 from jupyter_releaser import util
 
 PACKAGE_JSON = util.PACKAGE_JSON
-
-
-def build_dist(package, dist_dir):
-    """Build npm dist file(s) from a package"""
+METADATA_NAME = ".npm-metadata.json"
+WORKSPACE_INDEX_NAME = "jupyter-releaser-workspace-index.json"
+DEPENDENCY_KEYS = ["dependencies", "peerDependencies", "optionalDependencies"]
+
+_WORKSPACE_INDEXES = dict()
+_TOOL_VERSIONS = dict()
+
+# Cached installs that have not been used for this many seconds are removed
+INSTALL_CACHE_EXPIRE = 7 * 24 * 60 * 60
+
+PUBLISH_RETRIES = 3
+PUBLISH_BACKOFF = 2
+# Errors that are worth retrying a publish for
+TRANSIENT_ERRORS = [
+    "ETIMEDOUT",
+    "ECONNRESET",
+    "ECONNREFUSED",
+    "EAI_AGAIN",
+    "E429",
+    "E500",
+    "E502",
+    "E503",
+    "E504",
+]
+# Errors that mean the version was already published
+EXISTING_ERRORS = ["EPUBLISHCONFLICT", "cannot publish over"]
+# Publish options that are not passed on when checking for existing versions
+PUBLISH_ONLY_OPTIONS = ["--access", "--dry-run", "--otp", "--provenance", "--tag"]
+
+# Require each package in turn and report the timing as json
+SMOKE_TEST_SCRIPT = """
+const results = %s.map(name => {
+  const start = process.hrtime.bigint();
+  let error = null;
+  try {
+    require(name);
+  } catch (e) {
+    error = String(e);
+  }
+  const duration = Number(process.hrtime.bigint() - start) / 1e9;
+  return { name, ok: error === null, duration, error };
+});
+console.log(JSON.stringify(results));
+process.exitCode = results.every(r => r.ok) ? 0 : 1;
+"""
+
+
+def build_dist(package, dist_dir, incremental=False, skip_unchanged=False):
+    """Build npm dist file(s) from a package.
+
+    With `incremental`, workspace packages whose files are unchanged since
+    the last release tag are reported, and with `skip_unchanged` they are
+    not packed.  Packages whose version was bumped are always packed, since
+    their new version is tagged and reported.
+    """
     # Clean the dist folder of existing npm tarballs
     os.makedirs(dist_dir, exist_ok=True)
     dest = Path(dist_dir)
     for pkg in glob(f"{dist_dir}/*.tgz"):
         os.remove(pkg)
 
+    metadata = dict()
+
     if osp.isdir(package):
         basedir = package
-        tarball = osp.join(package, util.run("npm pack", cwd=package))
+        data = json.loads(Path(package, "package.json").read_text(encoding="utf-8"))
+        info = pack_package(package)
+        tarball = Path(package) / info["filename"]
     else:
         basedir = osp.dirname(package)
         tarball = package
-
-    data = extract_package(tarball)
+        info = get_tarball_metadata(tarball)
+        data = dict()
 
     # Move the tarball into the dist folder if public
-    if not data.get("private", False) == True:
+    if not info["private"]:
         shutil.move(str(tarball), str(dest))
+        metadata[info["filename"]] = info
     elif osp.isdir(package):
         os.remove(tarball)
 
-    if not osp.isdir(package):
-        return
-
     if "workspaces" in data:
-        all_data = dict()
-        packages = data["workspaces"].get("packages", [])
-        for pattern in packages:
-            for path in glob(osp.join(basedir, pattern), recursive=True):
-                path = Path(path)
-                package_json = path / "package.json"
-                if not osp.exists(package_json):
-                    continue
-                data = json.loads(package_json.read_text(encoding="utf-8"))
-                if data.get("private", False) == True:
-                    continue
-                data["__path__"] = path
-                all_data[data["name"]] = data
-
-        i = 0
-        for (name, data) in sorted(all_data.items()):
-            i += 1
-            path = data["__path__"]
-            util.log(f'({i}/{len(all_data)}) Packing {data["name"]}...')
-            tarball = path / util.run("npm pack", cwd=path, quiet=True)
-            shutil.move(str(tarball), str(dest))
+        index = get_workspace_index(basedir)
+        names = [name for name in index if not index[name]["private"]]
+        if incremental or skip_unchanged:
+            (unchanged, skipped) = get_unchanged_package_sets(basedir)
+            unchanged = [name for name in names if name in unchanged]
+            util.log(f"{len(unchanged)} packages unchanged since last release:")
+            for name in unchanged:
+                util.log(f"  {name}")
+            if skip_unchanged:
+                for name in unchanged:
+                    if name not in skipped:
+                        util.log(f"Packing {name} since its version was bumped")
+                names = [name for name in names if name not in skipped]
+        paths = [Path(basedir) / index[name]["path"] for name in names]
+        util.log(f"Packing {len(names)} packages...")
+        with ThreadPoolExecutor(max_workers=util.MAX_WORKERS) as executor:
+            infos = list(executor.map(pack_package, paths))
+
+        for (i, (path, info)) in enumerate(zip(paths, infos)):
+            util.log(f"({i + 1}/{len(names)}) Packed {info['name']}")
+            shutil.move(str(path / info["filename"]), str(dest))
+            metadata[info["filename"]] = info
+
+    write_metadata(dist_dir, metadata)
+
+
+def pack_package(path):
+    """Run `npm pack` in a package directory and get the tarball metadata"""
+    output = util.run("npm pack --json", cwd=path, quiet=True)
+    # Lifecycle scripts may write to stdout ahead of the json report
+    start = 0 if output.startswith("[") else output.rindex("\n[") + 1
+    info = json.loads(output[start:])[0]
+    data = json.loads(Path(path, "package.json").read_text(encoding="utf-8"))
+    return dict(
+        name=info["name"],
+        version=info["version"],
+        filename=osp.basename(info["filename"]),
+        integrity=info["integrity"],
+        size=info["size"],
+        files=[f["path"] for f in info["files"]],
+        dependencies=get_dependencies(data),
+        private=data.get("private", False) == True,
+    )
+
+
+def get_dependencies(data):
+    """Get the dependency ranges of all kinds from package json data"""
+    dependencies = dict()
+    for key in reversed(DEPENDENCY_KEYS):
+        dependencies.update(data.get(key, {}))
+    return dependencies
+
+
+def get_tarball_metadata(path):
+    """Get the package metadata by reading a tarball"""
+    with tarfile.open(path) as fid:
+        data = fid.extractfile("package/package.json").read()
+        files = [m.name for m in fid.getmembers() if m.isfile()]
+    data = json.loads(data.decode("utf-8"))
+
+    sha512 = hashlib.sha512(Path(path).read_bytes()).digest()
+    data.update(
+        filename=osp.basename(path),
+        integrity="sha512-" + base64.b64encode(sha512).decode("utf-8"),
+        size=osp.getsize(path),
+        files=[f.split("/", 1)[-1] for f in files],
+        dependencies=get_dependencies(data),
+        private=data.get("private", False) == True,
+    )
+    return data
+
+
+def write_metadata(dist_dir, metadata):
+    """Write the npm tarball metadata next to the dist files.
+
+    The mtime of each tarball is recorded to detect rebuilt tarballs.
+    """
+    for (filename, info) in metadata.items():
+        info["mtime"] = (Path(dist_dir) / filename).stat().st_mtime_ns
+    path = Path(dist_dir) / METADATA_NAME
+    path.write_text(json.dumps(metadata, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def read_metadata(dist_dir):
+    """Read the npm tarball metadata for a dist dir, keyed by file name.
+
+    Entries whose tarball is missing or has changed size or mtime are
+    dropped.
+    """
+    path = Path(dist_dir) / METADATA_NAME
+    if not path.exists():
+        return dict()
+    metadata = json.loads(path.read_text(encoding="utf-8"))
+    for (filename, info) in list(metadata.items()):
+        tarball = Path(dist_dir) / filename
+        try:
+            stat = tarball.stat()
+        except OSError:
+            del metadata[filename]
+            continue
+        if stat.st_size != info["size"] or stat.st_mtime_ns != info.get("mtime"):
+            del metadata[filename]
+    return metadata
+
+
+def get_dist_metadata(dist_dir):
+    """Get the metadata for all of the npm tarballs in a dist dir"""
+    metadata = read_metadata(dist_dir)
+    for path in sorted(glob(f"{dist_dir}/*.tgz")):
+        if osp.basename(path) not in metadata:
+            metadata[osp.basename(path)] = get_tarball_metadata(path)
+    return metadata
+
+
+def get_install_key(metadata):
+    """Get a content hash for an install of the given tarballs.
+
+    The key covers the node and npm versions, and the integrity of each
+    tarball and its dependency ranges.
+    """
+    sha256 = hashlib.sha256()
+    sha256.update(get_tool_versions().encode("utf-8"))
+    for filename in sorted(metadata):
+        info = metadata[filename]
+        sha256.update(info["integrity"].encode("utf-8"))
+        deps = json.dumps(info["dependencies"], sort_keys=True)
+        sha256.update(deps.encode("utf-8"))
+    return sha256.hexdigest()
+
+
+def get_tool_versions():
+    """Get the node and npm versions, cached for the process"""
+    if "versions" not in _TOOL_VERSIONS:
+        node = util.run("node --version", quiet=True)
+        npm = util.run("npm --version", quiet=True)
+        _TOOL_VERSIONS["versions"] = f"node {node}, npm {npm}"
+    return _TOOL_VERSIONS["versions"]
 
 
 def extract_dist(dist_dir, target):
@@ -70,56 +246,263 @@ def extract_dist(dist_dir, target):
     paths = sorted(glob(f"{dist_dir}/*.tgz"))
     util.log(f"Extracting {len(paths)} packages...")
 
-    for package in paths:
-        path = Path(package)
+    target = Path(target)
+    metadata = read_metadata(dist_dir)
+
+    def extract(path):
+        return extract_tarball(path, target, metadata.get(osp.basename(path)))
+
+    with ThreadPoolExecutor(max_workers=util.MAX_WORKERS) as executor:
+        results = list(executor.map(extract, paths))
 
-        data = extract_package(path)
+    for data in results:
         name = data["name"]
 
         # Skip if it is a private package
-        if data.get("private", False):  # pragma: no cover
+        if data["private"]:  # pragma: no cover
             util.log(f"Skipping private package {name}")
             continue
 
         names.append(name)
 
-        pkg_dir = target / name
-        if not pkg_dir.parent.exists():
-            os.makedirs(pkg_dir.parent)
+    return names
 
-        tar = tarfile.open(path)
-        tar.extractall(target)
-        tar.close()
 
-        shutil.move(str(target / "package"), str(pkg_dir))
+def extract_tarball(path, target, info=None):
+    """Stream a package tarball into `target/<name>` in a single pass.
+
+    The package metadata is returned, and is read from the `package.json`
+    member along the way if `info` is not given.
+    """
+    path = Path(path)
+    if info and info["private"]:
+        return info
+
+    if info:
+        dest = target / info["name"]
+    else:
+        dest = target / f".{path.name}.partial"
+    if dest.exists():
+        shutil.rmtree(dest)
+    os.makedirs(dest)
+
+    data = None
+    with tarfile.open(path, "r|gz") as tar:
+        for member in tar:
+            # Strip the top level folder, usually "package"
+            name = posixpath.normpath(member.name.lstrip("/")).partition("/")[2]
+            if not name or name == ".." or name.startswith("../"):
+                continue
+            out = dest / name
+            if member.isdir():
+                os.makedirs(out, exist_ok=True)
+                continue
+            if not member.isfile():
+                continue
+            os.makedirs(out.parent, exist_ok=True)
+            fid = tar.extractfile(member)
+            if name == "package.json" and not info:
+                raw = fid.read()
+                data = json.loads(raw.decode("utf-8"))
+                out.write_bytes(raw)
+            else:
+                with open(out, "wb") as f:
+                    shutil.copyfileobj(fid, f, util.BUF_SIZE)
+            os.chmod(out, member.mode & 0o777)
+
+    if info:
+        return info
+
+    if data is None:
+        raise ValueError(f"No package.json found in {path}")
+    data["private"] = data.get("private", False) == True
+    if data["private"]:
+        shutil.rmtree(dest)
+        return data
+
+    pkg_dir = target / data["name"]
+    os.makedirs(pkg_dir.parent, exist_ok=True)
+    if pkg_dir.exists():
+        shutil.rmtree(pkg_dir)
+    os.replace(dest, pkg_dir)
+    return data
 
-    return names
 
+def check_dist(dist_dir, test_cmd=None, cache_dir=None, direct_install=False, shards=0):
+    """Check npm dist file(s) in a dist dir.
 
-def check_dist(dist_dir, test_cmd=None):
-    """Check npm dist file(s) in a dist dir"""
+    If a `cache_dir` is given, the isolated install is kept there keyed by
+    the content of the tarballs, and npm installs prefer its offline cache.
+    Cached installs that have not been used for `INSTALL_CACHE_EXPIRE`
+    seconds are removed.
+    With `direct_install`, the tarballs are installed as they are rather
+    than being extracted into a staging folder first.  With `shards`, the
+    packages are split across that many isolated installs that are checked
+    in parallel.
+    """
+    if shards:
+        return check_shards(dist_dir, shards, test_cmd=test_cmd, cache_dir=cache_dir)
+
+    infos = None
+    if direct_install:
+        infos = get_public_metadata(dist_dir)
+    check_install(dist_dir, test_cmd=test_cmd, cache_dir=cache_dir, infos=infos)
+
+
+def check_install(dist_dir, test_cmd=None, cache_dir=None, infos=None, script=None):
+    """Install npm tarballs into an isolated package and run a test command.
+
+    The tarballs given by the `infos` metadata are installed directly,
+    otherwise all of the tarballs in `dist_dir` are extracted and installed.
+    The `script` is written to `index.js`, and defaults to requiring each
+    package.  Returns the output of the test command.
+    """
     if not test_cmd:
         test_cmd = "node index.js"
 
-    tmp_dir = Path(TemporaryDirectory().name)
+    install_dir = None
+    npm_args = ""
+    if cache_dir:
+        cache_dir = Path(osp.expanduser(cache_dir))
+        if infos is None:
+            key = get_install_key(get_dist_metadata(dist_dir))
+        else:
+            key = get_install_key({info["filename"]: info for info in infos})
+        install_dir = cache_dir / "installs" / key
+        prune_installs(cache_dir / "installs", keep=key)
+        if install_dir.exists():
+            util.log(f"Using cached install in {install_dir}")
+            # Mark the install as recently used
+            os.utime(install_dir)
+            if script:
+                install_dir.joinpath("index.js").write_text(script, encoding="utf-8")
+            return util.run(test_cmd, cwd=install_dir)
+
+        tmp_dir = cache_dir / "installs" / f"{key}.partial"
+        shutil.rmtree(str(tmp_dir), ignore_errors=True)
+        npm_cache = util.normalize_path(cache_dir / "npm")
+        npm_args = f" --prefer-offline --cache {npm_cache}"
+    else:
+        tmp_dir = Path(TemporaryDirectory().name)
+
     os.makedirs(tmp_dir)
 
     util.run("npm init -y", cwd=tmp_dir)
-    names = []
-    staging = tmp_dir / "staging"
 
-    names = extract_dist(dist_dir, staging)
-
-    install_str = " ".join(f"./staging/{name}" for name in names)
+    if infos is not None:
+        names = [info["name"] for info in infos]
+        tarballs = [osp.abspath(osp.join(dist_dir, i["filename"])) for i in infos]
+        install_str = " ".join(util.normalize_path(t) for t in tarballs)
+    else:
+        staging = tmp_dir / "staging"
+        names = extract_dist(dist_dir, staging)
+        install_str = " ".join(f"./staging/{name}" for name in names)
 
-    util.run(f"npm install {install_str}", cwd=tmp_dir)
+    util.run(f"npm install {install_str}{npm_args}", cwd=tmp_dir)
 
-    text = "\n".join([f'require("{name}")' for name in names])
+    text = script or "\n".join([f'require("{name}")' for name in names])
     tmp_dir.joinpath("index.js").write_text(text, encoding="utf-8")
 
-    util.run(test_cmd, cwd=tmp_dir)
+    output = util.run(test_cmd, cwd=tmp_dir)
+
+    if install_dir:
+        # Only keep installs that pass the test command
+        os.replace(tmp_dir, install_dir)
+    else:
+        shutil.rmtree(str(tmp_dir), ignore_errors=True)
 
-    shutil.rmtree(str(tmp_dir), ignore_errors=True)
+    return output
+
+
+def prune_installs(installs_dir, keep=None):
+    """Remove the cached installs that have not been used recently"""
+    if not osp.isdir(installs_dir):
+        return
+    now = time.time()
+    for entry in os.scandir(installs_dir):
+        if entry.name == keep or entry.name.endswith(".partial"):
+            continue
+        try:
+            expired = now - entry.stat().st_mtime > INSTALL_CACHE_EXPIRE
+        except OSError:
+            continue
+        if expired:
+            util.log(f"Removing unused cached install {entry.name}")
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def check_shards(dist_dir, shards, test_cmd=None, cache_dir=None):
+    """Check npm tarballs in parallel shards, each with an isolated install.
+
+    Returns a list of results with the name, pass/fail status, and duration
+    for each package.  Without a custom `test_cmd`, each package is timed
+    separately, otherwise the packages share the result of their shard.
+    """
+    infos = get_public_metadata(dist_dir)
+    groups = [infos[i::shards] for i in range(shards)]
+    groups = [group for group in groups if group]
+    util.log(f"Checking {len(infos)} packages in {len(groups)} shards...")
+    by_name = {info["name"]: info for info in infos}
+
+    # Include the peer and optional dependency edges of the workspace
+    edges = {name: set(info["dependencies"]) for (name, info) in by_name.items()}
+    if PACKAGE_JSON.exists():
+        data = json.loads(PACKAGE_JSON.read_text(encoding="utf-8"))
+        if "workspaces" in data:
+            for (name, info) in get_workspace_index().items():
+                edges.setdefault(name, set()).update(info["dependencies"])
+
+    def check(group):
+        names = [info["name"] for info in group]
+        script = None if test_cmd else SMOKE_TEST_SCRIPT % json.dumps(names)
+
+        # Install the internal dependencies of the shard alongside it
+        install = dict()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name in install or name not in by_name:
+                continue
+            install[name] = by_name[name]
+            pending.extend(edges[name])
+        install = [install[name] for name in sorted(install)]
+
+        start = time.time()
+        ok = True
+        try:
+            output = check_install(dist_dir, test_cmd, cache_dir, install, script)
+        except CalledProcessError as e:
+            ok = False
+            output = (e.output or b"").decode("utf-8", "replace").strip()
+        duration = time.time() - start
+
+        if not test_cmd and output:
+            try:
+                return json.loads(output.splitlines()[-1])
+            except ValueError:
+                pass
+        return [dict(name=name, ok=ok, duration=duration) for name in names]
+
+    with ThreadPoolExecutor(max_workers=min(util.MAX_WORKERS, len(groups))) as executor:
+        results = [r for shard in executor.map(check, groups) for r in shard]
+
+    failed = []
+    for result in results:
+        status = "PASS" if result["ok"] else "FAIL"
+        util.log(f"{status} {result['name']} ({result['duration']:.2f}s)")
+        if not result["ok"]:
+            failed.append(result["name"])
+
+    if failed:
+        raise ValueError(f"npm check failed for {', '.join(failed)}")
+
+    return results
+
+
+def get_public_metadata(dist_dir):
+    """Get the metadata for the public tarballs in a dist dir"""
+    metadata = get_dist_metadata(dist_dir)
+    return [metadata[f] for f in sorted(metadata) if not metadata[f]["private"]]
 
 
 def extract_package(path):
@@ -131,6 +514,120 @@ def extract_package(path):
     return data
 
 
+def get_publish_levels(metadata):
+    """Group tarball metadata into levels in internal dependency order.
+
+    Each level only depends on packages in the levels before it.  Packages
+    caught in a dependency cycle are published together in a final level.
+    """
+    infos = {info["name"]: info for info in metadata.values()}
+    deps = dict()
+    for (name, info) in infos.items():
+        deps[name] = set(d for d in info["dependencies"] if d in infos and d != name)
+
+    levels = []
+    done = set()
+    while len(done) < len(infos):
+        level = sorted(n for n in infos if n not in done and deps[n] <= done)
+        if not level:
+            level = sorted(set(infos) - done)
+            util.log(f"Warning: circular dependencies between {level}")
+        levels.append([infos[name] for name in level])
+        done.update(level)
+    return levels
+
+
+def publish_dist(dist_dir, npm_cmd="npm publish"):
+    """Publish the npm tarballs in a dist dir in dependency order.
+
+    Packages within a level are published concurrently, transient failures
+    are retried, and versions that already exist are skipped.  Returns the
+    names of the published packages.
+    """
+    metadata = get_dist_metadata(dist_dir)
+    levels = get_publish_levels(
+        {f: info for (f, info) in metadata.items() if not info["private"]}
+    )
+
+    def publish(info):
+        return publish_package(dist_dir, info, npm_cmd)
+
+    published = []
+    for (i, level) in enumerate(levels):
+        names = ", ".join(info["name"] for info in level)
+        util.log(f"({i + 1}/{len(levels)}) Publishing {names}...")
+        with ThreadPoolExecutor(
+            max_workers=min(util.MAX_WORKERS, len(level))
+        ) as executor:
+            results = list(executor.map(publish, level))
+        published.extend(info["name"] for (info, r) in zip(level, results) if r)
+
+    return published
+
+
+def publish_package(dist_dir, info, npm_cmd="npm publish"):
+    """Publish a single npm tarball, returning False if it already exists"""
+    spec = f"{info['name']}@{info['version']}"
+    view_cmd = get_view_command(npm_cmd)
+    existing = ""
+    if view_cmd:
+        try:
+            existing = util.run(f"{view_cmd} {spec} version", cwd=dist_dir, quiet=True)
+        except CalledProcessError:
+            # The package itself has not been published yet
+            pass
+    if existing.strip():
+        util.log(f"Skipping existing {spec}")
+        return False
+
+    for attempt in range(PUBLISH_RETRIES + 1):
+        util.log(f"+ {npm_cmd} {info['filename']}")
+        try:
+            util.run(f"{npm_cmd} {info['filename']}", cwd=dist_dir, quiet=True)
+            return True
+        except CalledProcessError as e:
+            output = (e.stderr or b"").decode("utf-8", "replace")
+            output += (e.output or b"").decode("utf-8", "replace")
+            if any(err in output for err in EXISTING_ERRORS):
+                util.log(f"Skipping existing {spec}")
+                return False
+            transient = any(err in output for err in TRANSIENT_ERRORS)
+            if not transient or attempt == PUBLISH_RETRIES:
+                raise
+            delay = PUBLISH_BACKOFF * 2 ** attempt
+            util.log(f"Retrying {spec} in {delay}s after transient failure")
+            time.sleep(delay)
+
+
+def get_view_command(npm_cmd="npm publish"):
+    """Get the `npm view` command for the registry a publish command targets.
+
+    The registry and config options of `npm_cmd` are passed on, and None is
+    returned for a dry run, which does not need to check the registry.
+    """
+    parts = shlex.split(npm_cmd)
+    if "publish" in parts:
+        ind = parts.index("publish")
+        prefix, parts = parts[:ind], parts[ind + 1 :]
+    else:
+        prefix, parts = ["npm"], parts[1:]
+
+    args = []
+    while parts:
+        part = parts.pop(0)
+        name, _, value = part.partition("=")
+        # Options may take their value from the next argument
+        if not value and parts and not parts[0].startswith("-"):
+            value = parts.pop(0)
+            part = f"{part}={value}"
+        if name == "--dry-run" and value.lower() not in ["false", "0"]:
+            return None
+        if name.startswith("-") and name not in PUBLISH_ONLY_OPTIONS:
+            args.append(part)
+
+    return " ".join(shlex.quote(p) for p in prefix + ["view"] + args)
+
+
 def handle_auth_token(npm_token):
     """Handle token auth for npm registry"""
     npmrc = Path(".npmrc")
@@ -140,6 +637,172 @@ def handle_auth_token(npm_token):
     npmrc.write_text(text, encoding="utf-8")
 
 
+def get_workspace_index(basedir="."):
+    """Get the index of npm workspace packages for a package directory.
+
+    The index maps package names to their version, path relative to
+    `basedir`, private flag, and internal dependencies.  It is cached for
+    the process and on disk in the git directory, and is rebuilt when the
+    mtimes of the manifests or the workspace folders change.
+    """
+    root = osp.abspath(basedir)
+    index = _WORKSPACE_INDEXES.get(root)
+    if index and index["mtimes"] == get_workspace_mtimes(root, index["mtimes"]):
+        return index["packages"]
+
+    cache_file = None
+    try:
+        git_dir = util.run("git rev-parse --git-dir", cwd=root, quiet=True)
+        cache_file = Path(root) / git_dir / WORKSPACE_INDEX_NAME
+    except CalledProcessError:
+        pass
+
+    index = None
+    if cache_file and cache_file.exists():
+        try:
+            index = json.loads(cache_file.read_text(encoding="utf-8"))
+        except ValueError:
+            util.log(f"Ignoring invalid workspace index {cache_file}")
+
+    if (
+        not index
+        or index.get("root") != root
+        or index["mtimes"] != get_workspace_mtimes(root, index["mtimes"])
+    ):
+        index = build_workspace_index(root)
+        if cache_file:
+            cache_file.write_text(json.dumps(index, indent=2), encoding="utf-8")
+
+    _WORKSPACE_INDEXES[root] = index
+    return index["packages"]
+
+
+def build_workspace_index(basedir="."):
+    """Build the index of npm workspace packages by reading their manifests"""
+    root = osp.abspath(basedir)
+    data = json.loads(Path(root, "package.json").read_text(encoding="utf-8"))
+    patterns = data.get("workspaces", {}).get("packages", [])
+
+    # Track the folders that hold the packages to find added packages
+    watched = ["package.json"]
+    for pattern in patterns:
+        base = []
+        for part in pattern.split("/"):
+            if any(c in part for c in "*?["):
+                break
+            base.append(part)
+        watched.append("/".join(base) or ".")
+
+    packages = dict()
+    for pattern in patterns:
+        for path in sorted(glob(osp.join(root, pattern), recursive=True)):
+            package_json = Path(path) / "package.json"
+            if not package_json.exists():
+                continue
+            sub_data = json.loads(package_json.read_text(encoding="utf-8"))
+            rel_path = util.normalize_path(osp.relpath(path, root))
+            watched.append(f"{rel_path}/package.json")
+            # Private packages may omit the name and version
+            if not sub_data.get("name"):
+                continue
+            packages[sub_data["name"]] = dict(
+                name=sub_data["name"],
+                version=sub_data.get("version"),
+                path=rel_path,
+                private=sub_data.get("private", False) == True,
+                dependencies=sorted(get_dependencies(sub_data)),
+            )
+
+    for info in packages.values():
+        info["dependencies"] = [d for d in info["dependencies"] if d in packages]
+
+    packages = {name: packages[name] for name in sorted(packages)}
+    return dict(
+        root=root, mtimes=get_workspace_mtimes(root, watched), packages=packages
+    )
+
+
+def get_workspace_mtimes(root, paths):
+    """Get the mtimes of the given paths relative to a workspace root"""
+    mtimes = dict()
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(osp.join(root, path)).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def get_unchanged_packages(basedir=".", since=None, ignore_version=True):
+    """Get the workspace packages whose files are unchanged since a tag.
+
+    The working tree is compared against `since`, which defaults to the
+    most recent tag merged into HEAD.  Changes to the `version` field of
+    `package.json` are ignored unless `ignore_version` is False.
+    """
+    (unchanged, untouched) = get_unchanged_package_sets(basedir, since)
+    return unchanged if ignore_version else untouched
+
+
+def get_unchanged_package_sets(basedir=".", since=None):
+    """Get the unchanged workspace packages from a single diff against a tag.
+
+    Returns the packages that are unchanged apart from their version, and
+    the packages that are entirely unchanged.
+    """
+    index = get_workspace_index(basedir)
+    if not index:
+        return [], []
+    if since is None:
+        since = util.get_tag_index().latest("HEAD")
+        if since is None:
+            return [], []
+
+    paths = " ".join(info["path"] for info in index.values())
+    cmd = f"git diff --name-only --relative {since} -- {paths}"
+    changed_files = util.run(cmd, cwd=basedir, quiet=True).splitlines()
+
+    untouched = []
+    candidates = []
+    for (name, info) in index.items():
+        prefix = info["path"] + "/"
+        changed = [f for f in changed_files if f.startswith(prefix)]
+        if changed == []:
+            untouched.append(name)
+        elif changed == [prefix + "package.json"]:
+            candidates.append(name)
+    unchanged = list(untouched)
+    if not candidates:
+        return unchanged, untouched
+
+    # Read the previous manifests in one batch to compare them
+    git_prefix = util.run("git rev-parse --show-prefix", cwd=basedir, quiet=True)
+    specs = [f"{since}:{git_prefix}{index[n]['path']}/package.json" for n in candidates]
+    stdin = ("\n".join(specs) + "\n").encode("utf-8")
+    output = util.run("git cat-file --batch", cwd=basedir, input=stdin, quiet=True)
+    output = output.encode("utf-8") + b"\n"
+
+    pos = 0
+    for name in candidates:
+        end = output.index(b"\n", pos)
+        header = output[pos:end].decode("utf-8").split()
+        pos = end + 1
+        if header[-1] == "missing":
+            continue
+        size = int(header[-1])
+        old_data = json.loads(output[pos : pos + size].decode("utf-8"))
+        pos += size + 1
+
+        path = Path(basedir) / index[name]["path"] / "package.json"
+        new_data = json.loads(path.read_text(encoding="utf-8"))
+        old_data.pop("version", None)
+        new_data.pop("version", None)
+        if old_data == new_data:
+            unchanged.append(name)
+
+    return sorted(unchanged), untouched
+
+
 def get_package_versions(version):
     """Get the formatted list of npm package names and versions"""
     message = ""
@@ -149,12 +812,9 @@ def get_package_versions(version):
         message += f'\nnpm version: {data["name"]}: {data["version"]}'
     if "workspaces" in data:
         message += "\nnpm workspace versions:"
-        packages = data["workspaces"].get("packages", [])
-        for pattern in packages:
-            for path in glob(pattern, recursive=True):
-                text = Path(path).joinpath("package.json").read_text()
-                data = json.loads(text)
-                message += f'\n{data["name"]}: {data["version"]}'
+        for (name, info) in get_workspace_index().items():
+            if info["version"]:
+                message += f'\n{name}: {info["version"]}'
     return message
 
 
@@ -164,17 +824,19 @@ def tag_workspace_packages():
         return
 
     data = json.loads(PACKAGE_JSON.read_text(encoding="utf-8"))
-    tags = util.run("git tag").splitlines()
+    tags = util.get_tag_index()
     if not "workspaces" in data:
         return
 
-    packages = data["workspaces"].get("packages", [])
-    for pattern in packages:
-        for path in glob(pattern, recursive=True):
-            sub_package_json = Path(path) / "package.json"
-            sub_data = json.loads(sub_package_json.read_text(encoding="utf-8"))
-            tag_name = f"{sub_data['name']}@{sub_data['version']}"
-            if tag_name in tags:
-                util.log(f"Skipping existing tag {tag_name}")
-            else:
-                util.run(f"git tag {tag_name}")
+    new_tags = []
+    for (name, info) in get_workspace_index().items():
+        if not info["version"]:
+            continue
+        tag_name = f"{name}@{info['version']}"
+        if tag_name in tags:
+            util.log(f"Skipping existing tag {tag_name}")
+        else:
+            new_tags.append(tag_name)
+
+    util.log(f"Creating {len(new_tags)} workspace tags")
+    util.create_tags(new_tags)
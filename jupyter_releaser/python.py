@@ -1,56 +1,693 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
+import base64
+import csv
+import email.message
+import hashlib
+import io
 import os
 import os.path as osp
 import re
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import Parser
 from glob import glob
 from pathlib import Path
+from subprocess import CalledProcessError
 from tempfile import TemporaryDirectory
 
+import readme_renderer.rst
+import toml
+from build import ProjectBuilder
+from check_manifest import find_bad_ideas
+from check_manifest import format_list
+from check_manifest import format_missing
+from check_manifest import get_sdist_file_list
+from check_manifest import get_vcs_files
+from check_manifest import read_config
+from check_manifest import read_manifest
+from check_manifest import strip_sdist_extras
+from check_manifest import UI
+
 from jupyter_releaser import util
 
 PYPROJECT = util.PYPROJECT
 SETUP_PY = util.SETUP_PY
 
+# Identify an interpreter and the pip version it seeds venvs with
+INTERPRETER_INFO = (
+    "import ensurepip, sys; print(sys.executable, sys.version, ensurepip.version())"
+)
+
+# List the wheel tags supported by an interpreter, using the packaging
+# library vendored by pip
+SUPPORTED_TAGS = (
+    "from pip._vendor.packaging import tags; "
+    "print(' '.join(str(tag) for tag in tags.sys_tags()))"
+)
+
+# The PEP 517 fallback build requirements
+DEFAULT_BUILD_REQUIRES = ["setuptools>=40.8.0", "wheel"]
+
+# Files in a wheel's dist-info folder that are not listed in its RECORD
+RECORD_FILES = ["RECORD", "RECORD.jws", "RECORD.p7s"]
+
+# Hash algorithms allowed in a wheel RECORD
+RECORD_HASHES = hashlib.algorithms_guaranteed - {"md5", "sha1"}
+
+# Written once a cached venv is fully set up
+COMPLETE_MARKER = ".jupyter-releaser-complete"
+
+# Guard the cached venvs and wheelhouse populations when checking in
+# parallel, keyed by path
+_ENV_LOCKS = dict()
 
-def build_dist(dist_dir):
-    """Build the python dist files into a dist folder"""
+
+def build_dist(dist_dir, cache_dir=None):
+    """Build the python dist files into a dist folder.
+
+    If a `cache_dir` is given, pyproject builds use a cached build
+    environment instead of a new isolated environment for each build.
+    """
     # Clean the dist folder of existing npm tarballs
     os.makedirs(dist_dir, exist_ok=True)
     dest = Path(dist_dir)
     for pkg in glob(f"{dist_dir}/*.gz") + glob(f"{dist_dir}/*.whl"):
         os.remove(pkg)
 
-    if PYPROJECT.exists():
+    if PYPROJECT.exists() and cache_dir:
+        build_cached(dist_dir, cache_dir)
+    elif PYPROJECT.exists():
         util.run(f"python -m build --outdir {dist_dir} .")
     elif SETUP_PY.exists():
         util.run(f"python setup.py sdist --dist-dir {dist_dir}")
         util.run(f"python setup.py bdist_wheel --dist-dir {dist_dir}")
 
 
-def check_dist(dist_file, test_cmd=""):
-    """Check a Python package locally (not as a cli)"""
+def check_manifest(dist_dir):
+    """Check the manifest against the sdist in the dist folder.
+
+    Compares the files in the sdist with the files in git, using the
+    `check-manifest` ignore rules, instead of building new sdists.
+    """
+    sdists = sorted(glob(f"{dist_dir}/*.tar.gz"))
+    if not sdists:
+        util.log(f"No sdist found in {dist_dir}, building one")
+        util.run("check-manifest -v")
+        return
+
+    ui = UI()
+    ignore, ignore_bad_ideas = read_config()
+    ignore += read_manifest(ui)
+    all_source_files = get_vcs_files(ui)
+    source_files = strip_sdist_extras(ignore, all_source_files)
+    sdist_files = get_sdist_file_list(sdists[-1], ignore)
+    util.log(
+        f"Comparing {len(source_files)} files in git with "
+        f"{len(sdist_files)} files in {osp.basename(sdists[-1])}"
+    )
+
+    errors = []
+    missing_from_sdist = set(source_files) - set(sdist_files)
+    missing_from_git = set(sdist_files) - set(source_files)
+    if missing_from_sdist or missing_from_git:
+        missing = format_missing(missing_from_git, missing_from_sdist, "VCS", "sdist")
+        errors.append(
+            f"lists of files in version control and sdist do not match!\n{missing}"
+        )
+
+    bad_ideas = ignore_bad_ideas.filter(find_bad_ideas(all_source_files))
+    if bad_ideas:
+        errors.append(
+            "auto-generated files should not be in version control:\n"
+            + format_list(bad_ideas)
+        )
+
+    if errors:
+        raise ValueError("\n".join(errors))
+    util.log("lists of files in version control and sdist match")
+
+
+def check_dist(dist_file, test_cmd="", cache_dir=None):
+    """Check a Python package locally (not as a cli).
+
+    If a `cache_dir` is given, the venv is cloned from a cached template
+    rather than being created and having pip upgraded for each check, and
+    the dist file is installed offline from a local wheelhouse.
+    """
     dist_file = util.normalize_path(dist_file)
+    check_static(dist_file)
     util.run(f"twine check {dist_file}")
+    check_install(dist_file, test_cmd=test_cmd, cache_dir=cache_dir)
+
+
+def check_dists(dist_files, test_cmd="", cache_dir=None, pythons=None):
+    """Check Python dist files in parallel, each with an isolated install.
+
+    Each file is checked with each of the `pythons` interpreters, which
+    share the venv templates and wheelhouse in `cache_dir`.  `twine check`
+    is run once for all of the files.  Wheels that are not compatible with
+    an interpreter only get the static checks.  Returns a list of results
+    with the file name, interpreter, pass/fail status, whether it was
+    installed, and duration for each pair.
+    """
+    pythons = list(pythons or ["python"])
+    dist_files = [util.normalize_path(dist_file) for dist_file in dist_files]
+    if not dist_files:
+        return []
+
+    # Fail fast on broken files before building any venvs
+    start = time.time()
+    errors = []
+    for dist_file in dist_files:
+        try:
+            check_static(dist_file)
+        except ValueError as e:
+            errors.append(str(e))
+    if errors:
+        raise ValueError("\n".join(errors))
+    util.log(f"Static checks passed ({time.time() - start:.2f}s)")
+
+    util.run(f"twine check {' '.join(dist_files)}")
+    count = f"{len(dist_files)} dist files with {len(pythons)} interpreters"
+    util.log(f"Checking {count}...")
+
+    def get_tags(python):
+        return get_supported_tags(python, cache_dir=cache_dir)
+
+    workers = min(util.MAX_WORKERS, len(pythons))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        supported = dict(zip(pythons, executor.map(get_tags, pythons)))
+
+    def check(pair):
+        dist_file, python = pair
+        result = dict(name=osp.basename(dist_file), python=python, duration=0)
+        wheel_tags = get_wheel_tags(dist_file) if dist_file.endswith(".whl") else None
+        if wheel_tags is not None and not wheel_tags & supported[python]:
+            return dict(result, ok=True, installed=False, error=None)
+
+        start = time.time()
+        error = None
+        try:
+            check_install(dist_file, test_cmd, cache_dir=cache_dir, python=python)
+        except (CalledProcessError, ValueError) as e:
+            error = str(e)
+        duration = time.time() - start
+        result.update(duration=duration, error=error)
+        return dict(result, ok=not error, installed=True)
+
+    pairs = [(dist_file, python) for dist_file in dist_files for python in pythons]
+    workers = min(util.MAX_WORKERS, len(pairs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(check, pairs))
 
+    failed = []
+    for result in results:
+        label = result["name"]
+        if len(pythons) > 1:
+            label += f" on {result['python']}"
+        if not result["installed"]:
+            util.log(f"STATIC {label}")
+            continue
+        status = "PASS" if result["ok"] else "FAIL"
+        util.log(f"{status} {label} ({result['duration']:.2f}s)")
+        if not result["ok"]:
+            failed.append(f"{label}: {result['error']}")
+
+    if len(pythons) > 1:
+        util.log(format_matrix(results, pythons))
+
+    if failed:
+        raise ValueError("Python check failed for:\n" + "\n".join(failed))
+
+    return results
+
+
+def format_matrix(results, pythons):
+    """Format check results as a table of dist files by interpreter"""
+    cells = dict()
+    for result in results:
+        if not result["installed"]:
+            cell = "STATIC"
+        else:
+            status = "PASS" if result["ok"] else "FAIL"
+            cell = f"{status} {result['duration']:.2f}s"
+        cells.setdefault(result["name"], dict())[result["python"]] = cell
+
+    rows = [["dist file"] + pythons]
+    for name, row in cells.items():
+        rows.append([name] + [row.get(python, "") for python in pythons])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(row, widths)) for row in rows]
+    return "Python check matrix:\n" + "\n".join(line.rstrip() for line in lines)
+
+
+def check_install(dist_file, test_cmd="", cache_dir=None, python="python"):
+    """Install a dist file in an isolated venv and run the test command"""
     if not test_cmd:
-        # Get the package name from the dist file name
-        name = re.match(r"(\S+)-\d", osp.basename(dist_file)).groups()[0]
+        # Get the import name from the package metadata
+        name = normalize_name(read_dist_metadata(dist_file)["Name"])
         name = name.replace("-", "_")
         test_cmd = f'python -c "import {name}"'
 
     # Create venvs to install dist file
     # run the test command in the venv
-    with TemporaryDirectory() as td:
-        env_path = util.normalize_path(osp.abspath(td))
+    tmp_root = None
+    if cache_dir:
+        tmp_root = Path(osp.expanduser(cache_dir)) / "clones"
+        os.makedirs(tmp_root, exist_ok=True)
+
+    with TemporaryDirectory(dir=tmp_root) as td:
+        env_path = util.normalize_path(osp.abspath(osp.join(td, "env")))
         if os.name == "nt":  # pragma: no cover
             bin_path = f"{env_path}/Scripts/"
         else:
             bin_path = f"{env_path}/bin"
 
-        # Create the virtual env, upgrade pip,
-        # install, and run test command
-        util.run(f"python -m venv {env_path}")
-        util.run(f"{bin_path}/python -m pip install -U pip")
-        util.run(f"{bin_path}/pip install -q {dist_file}")
+        if cache_dir:
+            template = get_venv_template(cache_dir, python)
+            clone_venv(template, env_path)
+
+            # Install from the wheelhouse for this interpreter
+            wheelhouse = Path(osp.expanduser(cache_dir)) / "wheelhouse"
+            requirements = get_dist_requirements(dist_file)
+            populate_wheelhouse(
+                wheelhouse, requirements, f"{bin_path}/python", template.name
+            )
+            install_offline(f"{bin_path}/python", dist_file, wheelhouse)
+        else:
+            # Create the virtual env and upgrade pip
+            util.run(f"{python} -m venv {env_path}")
+            util.run(f"{bin_path}/python -m pip install -U pip")
+            util.run(f"{bin_path}/python -m pip install -q {dist_file}")
+
+        # Run the test command
         util.run(f"{bin_path}/{test_cmd}")
+
+
+def build_cached(dist_dir, cache_dir, python="python"):
+    """Build the sdist and wheel by calling the PEP 517 hooks directly,
+    in a cached build environment.
+
+    Like `python -m build`, the wheel is built from the unpacked sdist, so
+    files missing from the sdist break the wheel build.
+    """
+    data = toml.loads(PYPROJECT.read_text(encoding="utf-8"))
+    build_system = data.get("build-system", {})
+    requires = build_system.get("requires", DEFAULT_BUILD_REQUIRES)
+    env_python = get_build_env(cache_dir, requires, python)
+
+    # Requirements already installed in the environment
+    installed = Path(env_python).parent.parent / "build-requirements.txt"
+    known = set(requires)
+    if installed.exists():
+        known.update(installed.read_text(encoding="utf-8").splitlines())
+
+    def build(srcdir, distribution):
+        builder = ProjectBuilder(srcdir, python_executable=env_python)
+        # Install any new dynamic requirements of the backend
+        dynamic = builder.get_requires_for_build(distribution) - known
+        if dynamic:
+            reqs = " ".join(f'"{req}"' for req in sorted(dynamic))
+            util.run(f"{env_python} -m pip install -q {reqs}")
+            known.update(dynamic)
+            installed.write_text("\n".join(sorted(known)), encoding="utf-8")
+        util.log(f"Building {distribution} in {dist_dir}")
+        return builder.build(distribution, dist_dir)
+
+    sdist = build(".", "sdist")
+    with TemporaryDirectory() as td:
+        with tarfile.open(sdist) as tar:
+            tar.extractall(td)
+        srcdir = Path(td) / osp.basename(sdist)[: -len(".tar.gz")]
+        build(str(srcdir), "wheel")
+
+
+def get_build_env(cache_dir, requires, python="python"):
+    """Get the python of a cached build environment, creating it if needed.
+
+    Build environments are keyed by the build requirements and the
+    interpreter, and are cloned from the venv template.
+    """
+    template = get_venv_template(cache_dir, python)
+    text = "\n".join(sorted(requires))
+    key = hashlib.sha256(f"{template.name}\n{text}".encode("utf-8")).hexdigest()[:16]
+    env_path = Path(osp.expanduser(cache_dir)) / "build-envs" / key
+    env_python = get_venv_python(env_path)
+
+    with _ENV_LOCKS.setdefault(str(env_path), threading.Lock()):
+        if (env_path / COMPLETE_MARKER).exists():
+            util.log(f"Using build environment {env_path}")
+            return env_python
+
+        shutil.rmtree(env_path, ignore_errors=True)
+        os.makedirs(env_path.parent, exist_ok=True)
+        clone_venv(template, env_path)
+        if requires:
+            reqfile = env_path / "build-requirements.txt"
+            reqfile.write_text(text, encoding="utf-8")
+            reqfile = util.normalize_path(reqfile)
+            util.run(f"{env_python} -m pip install -q -r {reqfile}")
+        (env_path / COMPLETE_MARKER).write_text(text, encoding="utf-8")
+    return env_python
+
+
+def get_venv_python(env_path):
+    """Get the path to the python executable of a venv"""
+    env_path = util.normalize_path(osp.abspath(env_path))
+    if os.name == "nt":  # pragma: no cover
+        return f"{env_path}/Scripts/python"
+    return f"{env_path}/bin/python"
+
+
+def get_venv_template(cache_dir, python="python"):
+    """Get a cached base venv for an interpreter, building it if needed.
+
+    Templates are keyed by the interpreter and the pip version it seeds,
+    so pip is only upgraded when a template is built.
+    """
+    info = util.run(f'{python} -c "{INTERPRETER_INFO}"', quiet=True)
+    key = hashlib.sha256(info.encode("utf-8")).hexdigest()[:16]
+    template = Path(osp.expanduser(cache_dir)) / "templates" / key
+
+    # Build the template where it will live, since venvs are not relocatable
+    with _ENV_LOCKS.setdefault(str(template), threading.Lock()):
+        if (template / COMPLETE_MARKER).exists():
+            util.log(f"Using venv template {template}")
+            return template
+
+        shutil.rmtree(template, ignore_errors=True)
+        os.makedirs(template.parent, exist_ok=True)
+        util.run(f"{python} -m venv {util.normalize_path(template)}")
+        util.run(f"{get_venv_python(template)} -m pip install -U pip")
+        (template / COMPLETE_MARKER).write_text(info, encoding="utf-8")
+    return template
+
+
+def get_supported_tags(python="python", cache_dir=None):
+    """Get the set of wheel tags supported by an interpreter.
+
+    The tags are stored with the venv template when a `cache_dir` is given.
+    """
+    tags_file = None
+    if cache_dir:
+        template = get_venv_template(cache_dir, python)
+        tags_file = template / "supported-tags.txt"
+        if tags_file.exists():
+            return set(tags_file.read_text(encoding="utf-8").split())
+        python = get_venv_python(template)
+
+    tags = util.run(f'{python} -c "{SUPPORTED_TAGS}"', quiet=True)
+    if tags_file:
+        tags_file.write_text(tags, encoding="utf-8")
+    return set(tags.split())
+
+
+def get_wheel_tags(dist_file):
+    """Get the set of tags supported by a wheel, from its file name"""
+    parts = Path(dist_file).stem.lower().split("-")
+    pythons, abis, platforms = (part.split(".") for part in parts[-3:])
+    return {f"{p}-{a}-{plat}" for p in pythons for a in abis for plat in platforms}
+
+
+def clone_venv(template, dest):
+    """Clone a venv template, using hard links where possible.
+
+    Scripts that refer to the template path are rewritten for the clone.
+    """
+
+    def link(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    shutil.copytree(template, dest, symlinks=True, copy_function=link)
+
+    old = str(osp.abspath(template)).encode("utf-8")
+    new = str(osp.abspath(dest)).encode("utf-8")
+    for name in ["bin", "Scripts"]:
+        scripts = Path(dest) / name
+        if not scripts.is_dir():
+            continue
+        for script in scripts.iterdir():
+            if script.is_symlink() or not script.is_file():
+                continue
+            data = script.read_bytes()
+            if old not in data:
+                continue
+            # Replace the file rather than writing through the hard link
+            mode = script.stat().st_mode
+            script.unlink()
+            script.write_bytes(data.replace(old, new))
+            os.chmod(script, mode)
+
+
+def get_dist_requirements(dist_file):
+    """Get the requirements needed to install a dist file.
+
+    This includes the build requirements of an sdist.
+    """
+    path = Path(dist_file)
+    build_requires = []
+    if path.suffix != ".whl":
+        with tarfile.open(path) as tf:
+            top = tf.getnames()[0].split("/")[0]
+            try:
+                pyproject = tf.extractfile(f"{top}/pyproject.toml").read()
+            except KeyError:
+                pyproject = b""
+        data = toml.loads(pyproject.decode("utf-8"))
+        build_system = data.get("build-system", {})
+        build_requires = build_system.get("requires", DEFAULT_BUILD_REQUIRES)
+
+    requires = read_dist_metadata(path).get_all("Requires-Dist") or []
+    return sorted(set(requires + build_requires))
+
+
+def read_dist_metadata(dist_file):
+    """Read the core metadata of a wheel or sdist"""
+    path = Path(dist_file)
+    if path.suffix == ".whl":
+        with zipfile.ZipFile(path) as zf:
+            name = next(
+                n
+                for n in zf.namelist()
+                if n.endswith(".dist-info/METADATA") and n.count("/") == 1
+            )
+            metadata = zf.read(name)
+    else:
+        with tarfile.open(path) as tf:
+            top = tf.getnames()[0].split("/")[0]
+            metadata = tf.extractfile(f"{top}/PKG-INFO").read()
+    return Parser().parsestr(metadata.decode("utf-8"))
+
+
+def normalize_name(name):
+    """Normalize a distribution name as in PEP 503"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def check_static(dist_file):
+    """Verify a wheel or sdist in process, without installing it.
+
+    Checks the wheel RECORD and WHEEL file, or the sdist layout, and
+    that the metadata matches the file name and has a long description
+    that renders as it would for `twine check`.  Returns the distribution
+    name, or raises a ValueError listing the problems found.
+    """
+    path = Path(dist_file)
+    if path.suffix == ".whl":
+        parts = path.stem.split("-")
+        if len(parts) not in [5, 6]:
+            raise ValueError(f"{path.name}: invalid wheel file name")
+        name, version = parts[:2]
+        errors, metadata = _check_wheel(path)
+    else:
+        stem = path.name
+        for suffix in [".tar.gz", ".zip"]:
+            if stem.endswith(suffix):
+                stem = stem[: -len(suffix)]
+        name, _, version = stem.rpartition("-")
+        if not name:
+            raise ValueError(f"{path.name}: invalid sdist file name")
+        errors, metadata = _check_sdist(path, stem)
+
+    if metadata is not None:
+        for field in ["Metadata-Version", "Name", "Version"]:
+            if not metadata.get(field):
+                errors.append(f"Metadata is missing {field}")
+        meta_name = metadata.get("Name") or ""
+        if normalize_name(meta_name) != normalize_name(name):
+            errors.append(f'Metadata name "{meta_name}" does not match the file name')
+        meta_version = metadata.get("Version") or ""
+        if meta_version.replace("-", "_") != version.replace("-", "_"):
+            errors.append(
+                f'Metadata version "{meta_version}" does not match the file name'
+            )
+        errors.extend(_check_description(metadata))
+
+    if errors:
+        lines = "\n".join(f"  {error}" for error in errors)
+        raise ValueError(f"{path.name} failed static checks:\n{lines}")
+
+    util.log(f"Static checks passed for {path.name}")
+    return metadata["Name"]
+
+
+def _check_wheel(path):
+    """Check the contents of a wheel against its RECORD and WHEEL files"""
+    errors = []
+    with zipfile.ZipFile(path) as zf:
+        names = [n for n in zf.namelist() if not n.endswith("/")]
+        info_dirs = {n.split("/")[0] for n in names if ".dist-info/" in n}
+        info_dirs = [d for d in info_dirs if d.endswith(".dist-info")]
+        if len(info_dirs) != 1:
+            return [f"Expected one .dist-info folder, found {len(info_dirs)}"], None
+        info_dir = info_dirs[0]
+
+        missing = ["METADATA", "WHEEL", "RECORD"]
+        missing = [f for f in missing if f"{info_dir}/{f}" not in names]
+        if missing:
+            return [f"Missing {', '.join(missing)} in {info_dir}"], None
+
+        record = zf.read(f"{info_dir}/RECORD").decode("utf-8")
+        recorded = dict()
+        for row in csv.reader(record.splitlines()):
+            if row:
+                recorded[row[0]] = (row + ["", ""])[1:3]
+
+        skipped = [f"{info_dir}/{f}" for f in RECORD_FILES]
+        for name in names:
+            if name in skipped:
+                continue
+            if name not in recorded:
+                errors.append(f"{name} is not listed in RECORD")
+                continue
+            hash_value, size = recorded[name]
+            algorithm, _, expected = hash_value.partition("=")
+            if algorithm not in RECORD_HASHES:
+                errors.append(f"{name} has no valid hash in RECORD")
+                continue
+            digest = hashlib.new(algorithm)
+            length = 0
+            with zf.open(name) as fid:
+                for chunk in iter(lambda: fid.read(1 << 20), b""):
+                    digest.update(chunk)
+                    length += len(chunk)
+            actual = base64.urlsafe_b64encode(digest.digest()).rstrip(b"=")
+            if actual.decode("ascii") != expected:
+                errors.append(f"{name} does not match its RECORD hash")
+            if size and int(size) != length:
+                errors.append(f"{name} does not match its RECORD size")
+
+        for name in recorded:
+            if name not in names and name not in skipped:
+                errors.append(f"{name} is listed in RECORD but missing")
+
+        wheel = Parser().parsestr(zf.read(f"{info_dir}/WHEEL").decode("utf-8"))
+        for field in ["Wheel-Version", "Root-Is-Purelib", "Tag"]:
+            if not wheel.get(field):
+                errors.append(f"WHEEL is missing {field}")
+
+        metadata = zf.read(f"{info_dir}/METADATA").decode("utf-8")
+    return errors, Parser().parsestr(metadata)
+
+
+def _check_sdist(path, stem):
+    """Check the layout and PKG-INFO of an sdist"""
+    errors = []
+    with tarfile.open(path) as tf:
+        tops = {name.split("/")[0] for name in tf.getnames()}
+        if tops != {stem}:
+            errors.append(f"Files are not all in a top level {stem} folder")
+        try:
+            pkg_info = tf.extractfile(f"{stem}/PKG-INFO").read()
+        except KeyError:
+            return errors + ["Missing PKG-INFO"], None
+    return errors, Parser().parsestr(pkg_info.decode("utf-8"))
+
+
+def _check_description(metadata):
+    """Check that the long description renders as it would on PyPI"""
+    description = metadata.get_payload()
+    if not description or not description.strip():
+        # Older metadata versions use an indented header
+        description = metadata.get("Description") or ""
+        description = re.sub(r"\n {8}\|?", "\n", description)
+    if not description.strip() or description.rstrip() == "UNKNOWN":
+        util.log("`long_description` missing.")
+        return []
+
+    message = email.message.EmailMessage()
+    message["content-type"] = metadata.get("Description-Content-Type") or "text/x-rst"
+    content_type = message.get_content_type()
+    params = message["content-type"].params
+
+    # Plain text and markdown rendering cannot fail
+    if content_type in ["text/plain", "text/markdown"]:
+        return []
+
+    stream = io.StringIO()
+    if readme_renderer.rst.render(description, stream=stream, **params) is None:
+        return [
+            "`long_description` has syntax errors in markup and would not be "
+            f"rendered on PyPI.\n{stream.getvalue().strip()}"
+        ]
+    return []
+
+
+def populate_wheelhouse(wheelhouse, requirements, python, key):
+    """Populate a local wheelhouse once per set of requirements.
+
+    The `key` identifies the target interpreter.  Populations of different
+    sets of requirements can run in parallel, and each moves its wheels into
+    the wheelhouse when they are complete.  Returns whether the wheelhouse
+    was populated.
+    """
+    text = "\n".join(sorted(requirements))
+    digest = hashlib.sha256(f"{key}\n{text}".encode("utf-8")).hexdigest()[:16]
+    marker = Path(wheelhouse) / ".populated" / digest
+
+    with _ENV_LOCKS.setdefault(str(marker), threading.Lock()):
+        if marker.exists():
+            return False
+
+        os.makedirs(marker.parent, exist_ok=True)
+        if requirements:
+            util.log(f"Populating wheelhouse {wheelhouse}")
+            with TemporaryDirectory(dir=wheelhouse, prefix=".partial-") as td:
+                reqfile = Path(td) / "requirements.txt"
+                reqfile.write_text(text, encoding="utf-8")
+                wheel_dir = Path(td) / "wheels"
+                wheel_arg = util.normalize_path(wheel_dir)
+                util.run(
+                    f"{python} -m pip wheel -q --wheel-dir {wheel_arg} -r {reqfile}"
+                )
+                for path in wheel_dir.glob("*.whl"):
+                    os.replace(path, Path(wheelhouse) / path.name)
+        marker.write_text(text, encoding="utf-8")
+    return True
+
+
+def install_offline(python, dist_file, wheelhouse):
+    """Install a dist file using only the wheelhouse"""
+    wheel_dir = util.normalize_path(wheelhouse)
+    cmd = f"{python} -m pip install -q --no-index --find-links {wheel_dir} {dist_file}"
+    util.log(f"+ {cmd}")
+    try:
+        util.run(cmd, quiet=True)
+    except CalledProcessError as e:
+        stderr = e.stderr.decode("utf-8")
+        misses = re.findall(r"No matching distribution found for (\S+)", stderr)
+        if not misses:
+            raise e
+        populated = Path(wheelhouse) / ".populated"
+        raise ValueError(
+            f"Missing from wheelhouse {wheelhouse}: {', '.join(misses)} "
+            f"(remove {populated} to repopulate)"
+        ) from e
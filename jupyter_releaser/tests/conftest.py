@@ -3,8 +3,13 @@
 import json
 import os
 import os.path as osp
+import threading
+import time
 import traceback
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import unquote
 from urllib.request import OpenerDirector
 
 from click.testing import CliRunner
@@ -17,8 +22,14 @@ from jupyter_releaser.tests import util as testutil
 from jupyter_releaser.util import run
 
 
+@fixture(scope="session")
+def venv_cache(tmp_path_factory):
+    """A venv cache shared by the tests, since venvs are slow to create"""
+    return tmp_path_factory.mktemp("venv-cache")
+
+
 @fixture(autouse=True)
-def mock_env(mocker):
+def mock_env(mocker, tmp_path_factory, venv_cache):
     """Clear unwanted environment variables"""
     # Anything that starts with RH_ or GITHUB_
     prefixes = ["GITHUB_", "RH_"]
@@ -28,6 +39,10 @@ def mock_env(mocker):
             if key.startswith(prefix):
                 del env[key]
 
+    # Keep caches out of the home directory
+    env["RH_NPM_CACHE"] = str(tmp_path_factory.mktemp("npm-cache"))
+    env["RH_VENV_CACHE"] = str(venv_cache)
+
     mocker.patch.dict(os.environ, env, clear=True)
 
     try:
@@ -167,6 +182,202 @@ def open_mock(mocker):
     yield open_mock
 
 
+class NpmRegistry:
+    """A minimal in-memory stand-in for an npm registry"""
+
+    def __init__(self):
+        self.requests = []
+        self.packages = dict()
+        self.failures = dict()
+
+
+@fixture
+def npm_registry(mocker, tmp_path_factory):
+    """A local stand-in for the npm registry that records requests"""
+    registry = NpmRegistry()
+
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status, data):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            name = unquote(self.path.lstrip("/"))
+            registry.requests.append(("GET", name))
+            if name not in registry.packages:
+                return self.send_json(404, dict(error="Not found"))
+            versions = registry.packages[name]
+            latest = list(versions)[-1]
+            data = {
+                "name": name,
+                "versions": versions,
+                "dist-tags": dict(latest=latest),
+            }
+            self.send_json(200, data)
+
+        def do_PUT(self):
+            name = unquote(self.path.lstrip("/"))
+            registry.requests.append(("PUT", name))
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length).decode("utf-8"))
+            if registry.failures.get(name):
+                registry.failures[name] -= 1
+                return self.send_json(503, dict(error="Service unavailable"))
+            versions = registry.packages.setdefault(name, dict())
+            for (version, manifest) in data["versions"].items():
+                if version in versions:
+                    msg = f"You cannot publish over the previously published versions: {version}."
+                    return self.send_json(403, dict(error=msg))
+                versions[version] = manifest
+            self.send_json(201, dict(ok=True))
+
+        def do_POST(self):
+            registry.requests.append(("POST", self.path))
+            self.send_json(404, dict(error="Not found"))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host = f"127.0.0.1:{server.server_address[1]}"
+    npmrc = tmp_path_factory.mktemp("npmrc") / ".npmrc"
+    npmrc.write_text(f"//{host}/:_authToken=abc\n", encoding="utf-8")
+    env = dict(
+        npm_config_registry=f"http://{host}/",
+        npm_config_fetch_retries="0",
+        NPM_CONFIG_USERCONFIG=str(npmrc),
+    )
+    mocker.patch.dict(os.environ, env)
+    yield registry
+    server.shutdown()
+
+
+class LinkServer:
+    """A minimal stand-in for the web servers of checked links"""
+
+    def __init__(self):
+        self.url = ""
+        self.requests = []
+        self.failures = dict(flaky=1)
+        self.rate_limits = dict()
+
+
+@fixture
+def link_server():
+    """A local HTTP server for links that records requests"""
+    links = LinkServer()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            name = self.path.lstrip("/")
+            links.requests.append(name)
+            status = 200
+            if name == "missing":
+                status = 404
+            elif links.failures.get(name):
+                links.failures[name] -= 1
+                status = 503
+            elif links.rate_limits.get(name):
+                links.rate_limits[name] -= 1
+                status = 429
+            body = b"hello"
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    links.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield links
+    server.shutdown()
+
+
+class AssetServer:
+    """A minimal stand-in for a release asset server that supports ranges"""
+
+    def __init__(self):
+        self.url = ""
+        self.assets = dict()
+        self.requests = []
+        # Assets whose next response is cut short, stalled, or sent slowly
+        self.drops = set()
+        self.stalls = set()
+        self.throttles = set()
+
+
+@fixture
+def asset_server():
+    """A local HTTP server for release assets that records requests"""
+    assets = AssetServer()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            name = self.path.lstrip("/")
+            range_header = self.headers.get("Range")
+            assets.requests.append((name, range_header))
+            data = assets.assets[name]
+            start = 0
+            if range_header:
+                start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if name in assets.stalls:
+                assets.stalls.discard(name)
+                time.sleep(3)
+            body = data[start:]
+            self.send_response(206 if range_header else 200)
+            if range_header:
+                content_range = f"bytes {start}-{len(data) - 1}/{len(data)}"
+                self.send_header("Content-Range", content_range)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if name in assets.drops:
+                assets.drops.discard(name)
+                self.wfile.write(body[: len(body) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            if name in assets.throttles:
+                assets.throttles.discard(name)
+                size = len(body) // 8 + 1
+                for i in range(0, len(body), size):
+                    self.wfile.write(body[i : i + size])
+                    self.wfile.flush()
+                    time.sleep(0.1)
+                return
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    assets.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield assets
+    server.shutdown()
+
+
 @fixture
 def build_mock(mocker):
     orig_run = util.run
@@ -1,10 +1,12 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
+import json
 import os
 import os.path as osp
 import re
 import shutil
 import sys
+import time
 from glob import glob
 from pathlib import Path
 from subprocess import CalledProcessError
@@ -18,6 +20,7 @@ from pytest import fixture
 
 from jupyter_releaser import changelog
 from jupyter_releaser import cli
+from jupyter_releaser import lib
 from jupyter_releaser import npm
 from jupyter_releaser import python
 from jupyter_releaser import util
@@ -115,11 +118,14 @@ def test_list_envvars(runner):
         == """
 auth: GITHUB_ACCESS_TOKEN
 branch: RH_BRANCH
+cache-build-env: RH_CACHE_BUILD_ENV
 cache-file: RH_CACHE_FILE
 changelog-path: RH_CHANGELOG
 dist-dir: RH_DIST_DIR
 dry-run: RH_DRY_RUN
+interpreter: RH_PY_INTERPRETERS
 links-expire: RH_LINKS_EXPIRE
+npm-cache: RH_NPM_CACHE
 npm-cmd: RH_NPM_COMMAND
 npm-token: NPM_TOKEN
 output: RH_CHANGELOG_OUTPUT
@@ -129,6 +135,7 @@ resolve-backports: RH_RESOLVE_BACKPORTS
 test-cmd: RH_NPM_TEST_COMMAND
 twine-cmd: TWINE_COMMAND
 username: GITHUB_ACTOR
+venv-cache: RH_VENV_CACHE
 version-cmd: RH_VERSION_COMMAND
 version-spec: RH_VERSION_SPEC
 """.strip()
@@ -276,6 +283,45 @@ def test_build_python(py_package, runner, build_mock, git_prep):
     runner(["build-python"])
 
 
+def test_build_python_cached_env(py_package, runner, mocker, tmp_path, git_prep):
+    cache_dir = tmp_path / "venv-cache"
+    builder = mocker.patch.object(python, "ProjectBuilder", wraps=python.ProjectBuilder)
+    runner(["build-python", "--cache-build-env", "--venv-cache", cache_dir])
+    dist_dir = Path(util.CHECKOUT_NAME) / "dist"
+    assert sorted(os.listdir(dist_dir)) == [
+        "foo-0.0.1-py3-none-any.whl",
+        "foo-0.0.1.tar.gz",
+    ]
+    assert len(os.listdir(cache_dir / "build-envs")) == 1
+
+    # The wheel is built from the unpacked sdist
+    srcdirs = [c[0][0] for c in builder.call_args_list]
+    assert srcdirs[0] == "."
+    assert osp.basename(srcdirs[1]) == "foo-0.0.1"
+
+    orig_run = util.run
+    called = []
+
+    def wrapped(cmd, **kwargs):
+        called.append(cmd)
+        return orig_run(cmd, **kwargs)
+
+    mocker.patch("jupyter_releaser.util.run", wraps=wrapped)
+
+    # The build environment is reused
+    runner(["build-python", "--cache-build-env", "--venv-cache", cache_dir])
+    assert len(os.listdir(dist_dir)) == 2
+    assert not [c for c in called if "-m venv" in c or "pip install" in c]
+    assert not [c for c in called if "-m build" in c]
+
+    # A change in the build requirements gets a new environment
+    pyproject = Path(util.CHECKOUT_NAME) / "pyproject.toml"
+    text = pyproject.read_text(encoding="utf-8")
+    pyproject.write_text(text.replace('"wheel"', '"wheel>=0.30"'), encoding="utf-8")
+    runner(["build-python", "--cache-build-env", "--venv-cache", cache_dir])
+    assert len(os.listdir(cache_dir / "build-envs")) == 2
+
+
 def test_build_python_setup(py_package, runner, git_prep):
     Path(util.CHECKOUT_NAME).joinpath("pyproject.toml").unlink()
     runner(["build-python"])
@@ -290,6 +336,151 @@ def test_check_python(py_package, runner, build_mock, git_prep):
     runner(["check-python"])
 
 
+def test_check_python_venv_template(
+    py_package, runner, mocker, tmp_path, build_mock, git_prep
+):
+    runner(["build-python"])
+    cache_dir = tmp_path / "venv-cache"
+    runner(["check-python", "--venv-cache", cache_dir])
+    templates = os.listdir(cache_dir / "templates")
+    assert len(templates) == 1
+
+    # The template is built where it lives, so its scripts refer to it
+    if os.name != "nt":
+        pip_script = cache_dir / "templates" / templates[0] / "bin" / "pip"
+        shebang = pip_script.read_text(encoding="utf-8").splitlines()[0]
+        assert shebang.startswith(f"#!{cache_dir / 'templates' / templates[0]}/")
+
+    orig_run = util.run
+    called = []
+
+    def wrapped(cmd, **kwargs):
+        called.append(cmd)
+        return orig_run(cmd, **kwargs)
+
+    mocker.patch("jupyter_releaser.util.run", wraps=wrapped)
+
+    # The template is reused without creating a venv or upgrading pip
+    runner(["check-python", "--venv-cache", cache_dir])
+    assert not [c for c in called if "-m venv" in c or "install -U pip" in c]
+    assert os.listdir(cache_dir / "templates") == templates
+    assert os.listdir(cache_dir / "clones") == []
+
+
+def test_check_python_wheelhouse(
+    py_package, runner, mocker, tmp_path, build_mock, git_prep
+):
+    runner(["build-python"])
+    cache_dir = tmp_path / "venv-cache"
+    runner(["check-python", "--venv-cache", cache_dir])
+    wheelhouse = cache_dir / "wheelhouse"
+    assert glob(f"{wheelhouse}/setuptools-*.whl")
+
+    orig_run = util.run
+    called = []
+
+    def wrapped(cmd, **kwargs):
+        called.append(cmd)
+        return orig_run(cmd, **kwargs)
+
+    mocker.patch("jupyter_releaser.util.run", wraps=wrapped)
+
+    # Installs are served from the populated wheelhouse
+    runner(["check-python", "--venv-cache", cache_dir])
+    installs = [c for c in called if "pip install" in c]
+    assert len(installs) == 2
+    assert all("--no-index" in c for c in installs)
+    assert not [c for c in called if "pip wheel" in c]
+
+    # Misses are reported
+    for path in glob(f"{wheelhouse}/*.whl"):
+        os.remove(path)
+    with pytest.raises(ValueError) as e:
+        runner(["check-python", "--venv-cache", cache_dir])
+    assert "Missing from wheelhouse" in str(e.value)
+    assert "setuptools" in str(e.value)
+
+
+def test_check_python_concurrent(
+    py_package, runner, mocker, tmp_path, build_mock, git_prep
+):
+    runner(["build-python"])
+    cache_dir = tmp_path / "venv-cache"
+
+    orig_run = util.run
+    called = []
+
+    def wrapped(cmd, **kwargs):
+        called.append(cmd)
+        return orig_run(cmd, **kwargs)
+
+    mocker.patch("jupyter_releaser.util.run", wraps=wrapped)
+
+    result = runner(["check-python", "--venv-cache", cache_dir])
+    twine_calls = [c for c in called if c.startswith("twine check")]
+    assert len(twine_calls) == 1
+    assert ".whl" in twine_calls[0] and ".tar.gz" in twine_calls[0]
+    assert len(re.findall(r"PASS foo-0\.0\.1\S+ \(\d+\.\d+s\)", result.output)) == 2
+
+    # Failures are reported for each file
+    test_cmd = 'python -c "import missing_module"'
+    with pytest.raises(ValueError) as e:
+        runner(["check-python", "--venv-cache", cache_dir, "--test-cmd", test_cmd])
+    assert ".whl" in str(e.value) and ".tar.gz" in str(e.value)
+
+
+def test_check_python_incompatible_wheels(
+    py_package, runner, mocker, tmp_path, build_mock, git_prep
+):
+    runner(["build-python"])
+    dist_dir = py_package / util.CHECKOUT_NAME / "dist"
+    wheel = glob(f"{dist_dir}/*.whl")[0]
+    for tag in ["cp27-cp27m-win32", "cp36-cp36m-manylinux1_i686.musllinux_1_1_ppc"]:
+        shutil.copy(wheel, dist_dir / f"foo-0.0.1-{tag}.whl")
+
+    orig_run = util.run
+    called = []
+
+    def wrapped(cmd, **kwargs):
+        called.append(cmd)
+        return orig_run(cmd, **kwargs)
+
+    mocker.patch("jupyter_releaser.util.run", wraps=wrapped)
+
+    result = runner(["check-python", "--venv-cache", tmp_path / "venv-cache"])
+    assert "STATIC foo-0.0.1-cp27-cp27m-win32.whl" in result.output
+    assert "PASS foo-0.0.1-py3-none-any.whl" in result.output
+    installs = [c for c in called if "--no-index" in c]
+    assert len(installs) == 2
+    assert not [c for c in installs if "cp27" in c or "cp36" in c]
+
+
+def test_check_python_matrix(
+    py_package, runner, mocker, tmp_path, build_mock, git_prep
+):
+    runner(["build-python"])
+    cache_dir = tmp_path / "venv-cache"
+
+    orig_run = util.run
+    called = []
+
+    def wrapped(cmd, **kwargs):
+        called.append(cmd)
+        return orig_run(cmd, **kwargs)
+
+    mocker.patch("jupyter_releaser.util.run", wraps=wrapped)
+
+    # Two names for the same interpreter share a template
+    executable = util.normalize_path(sys.executable)
+    args = ["--interpreter", "python", "--interpreter", executable]
+    result = runner(["check-python", "--venv-cache", cache_dir] + args)
+    assert len(os.listdir(cache_dir / "templates")) == 1
+    assert len([c for c in called if "--no-index" in c]) == 4
+    assert "Python check matrix:" in result.output
+    assert re.search(r"foo-0\.0\.1\.tar\.gz +PASS \S+ +PASS", result.output)
+    assert f"PASS foo-0.0.1.tar.gz on {executable}" in result.output
+
+
 def test_handle_npm(npm_package, runner, git_prep):
     runner(["build-npm"])
     runner(["check-npm"])
@@ -300,10 +491,257 @@ def test_handle_npm_lerna(workspace_package, runner, git_prep):
     runner(["check-npm"])
 
 
+def test_handle_npm_metadata(workspace_package, runner, mocker, git_prep):
+    runner(["build-npm"])
+    dist_dir = Path(util.CHECKOUT_NAME) / "dist"
+    metadata = npm.read_metadata(dist_dir)
+    assert sorted(m["name"] for m in metadata.values()) == ["bar", "baz", "foo"]
+    for (filename, info) in metadata.items():
+        assert (dist_dir / filename).exists()
+        assert info["integrity"].startswith("sha512-")
+        assert "package.json" in info["files"]
+
+    # The harvested metadata is used instead of reading the tarballs
+    get_metadata = mocker.patch(
+        "jupyter_releaser.npm.get_tarball_metadata", wraps=npm.get_tarball_metadata
+    )
+    runner(["check-npm"])
+    get_metadata.assert_not_called()
+
+    # A rebuilt tarball of the same size is read again
+    tarball = dist_dir / "foo-1.0.0.tgz"
+    stat = tarball.stat()
+    os.utime(tarball, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert "foo-1.0.0.tgz" not in npm.read_metadata(dist_dir)
+    assert "bar-1.0.0.tgz" in npm.read_metadata(dist_dir)
+
+
+def test_workspace_index(workspace_package, mocker):
+    index = npm.get_workspace_index()
+    assert list(index) == ["bar", "baz", "foo"]
+    assert index["foo"]["path"] == "packages/foo"
+    assert index["foo"]["dependencies"] == ["bar"]
+    assert index["baz"]["dependencies"] == ["foo"]
+    assert not index["bar"]["private"]
+
+    # The index is reused until a manifest changes
+    build = mocker.patch(
+        "jupyter_releaser.npm.build_workspace_index", wraps=npm.build_workspace_index
+    )
+    npm._WORKSPACE_INDEXES.clear()
+    assert npm.get_workspace_index() == index
+    build.assert_not_called()
+
+    pkg_json = workspace_package / "packages" / "bar" / "package.json"
+    data = json.loads(pkg_json.read_text(encoding="utf-8"))
+    data["version"] = "2.0.0"
+    pkg_json.write_text(json.dumps(data), encoding="utf-8")
+    assert npm.get_workspace_index()["bar"]["version"] == "2.0.0"
+    build.assert_called_once()
+
+    # Added packages are picked up
+    new_dir = workspace_package / "packages" / "bizz"
+    os.makedirs(new_dir)
+    data["name"] = "bizz"
+    new_dir.joinpath("package.json").write_text(json.dumps(data), encoding="utf-8")
+    assert "bizz" in npm.get_workspace_index()
+
+    # Private packages may omit the name and version
+    for (name, private_data) in [("private", dict(name="private")), ("unnamed", {})]:
+        private_data["private"] = True
+        private_dir = workspace_package / "packages" / name
+        os.makedirs(private_dir)
+        private_dir.joinpath("package.json").write_text(
+            json.dumps(private_data), encoding="utf-8"
+        )
+    index = npm.get_workspace_index()
+    assert index["private"]["version"] is None
+    assert "unnamed" not in index
+    assert "private:" not in npm.get_package_versions("1.0.0")
+
+
+def test_build_npm_skip_unchanged(workspace_package, mocker):
+    run('git tag v1.0.0 -a -m "Release v1.0.0"')
+    for name in ["foo", "bar"]:
+        pkg_json = workspace_package / "packages" / name / "package.json"
+        data = json.loads(pkg_json.read_text(encoding="utf-8"))
+        data["version"] = "1.0.1"
+        pkg_json.write_text(json.dumps(data), encoding="utf-8")
+    index_js = workspace_package / "packages" / "foo" / "index.js"
+    index_js.write_text('console.log("changed")', encoding="utf-8")
+    util.clear_tag_index()
+
+    assert npm.get_unchanged_packages() == ["bar", "baz"]
+    assert npm.get_unchanged_packages(ignore_version=False) == ["baz"]
+
+    npm.build_dist(".", "dist", incremental=True)
+    assert len(glob("dist/*.tgz")) == 3
+
+    # Packages whose version was bumped are packed so the new version exists
+    mock_run = mocker.patch("jupyter_releaser.util.run", wraps=util.run)
+    npm.build_dist(".", "dist", skip_unchanged=True)
+    calls = [c[0][0] for c in mock_run.call_args_list]
+    assert len([c for c in calls if c.startswith("git diff")]) == 1
+    files = sorted(osp.basename(f) for f in glob("dist/*.tgz"))
+    assert files == ["bar-1.0.1.tgz", "foo-1.0.1.tgz"]
+
+
+def test_tag_workspace_packages(workspace_package, mocker):
+    run("git tag bar@1.0.0")
+    util.clear_tag_index()
+
+    mock_run = mocker.patch("jupyter_releaser.util.run", wraps=util.run)
+    npm.tag_workspace_packages()
+    calls = [c[0][0] for c in mock_run.call_args_list]
+    assert len([c for c in calls if c.startswith("git tag")]) == 0
+    assert len(calls) <= 7
+
+    index = util.get_tag_index()
+    assert "foo@1.0.0" in index and "baz@1.0.0" in index
+    assert run("git cat-file -t foo@1.0.0") == "tag"
+    assert run("git cat-file -t bar@1.0.0") == "commit"
+    assert "Release foo@1.0.0" in run("git tag -n1 foo@1.0.0")
+
+
+def test_check_npm_direct_install(
+    workspace_package, runner, mocker, npm_registry, git_prep
+):
+    runner(["build-npm"])
+    extract_dist = mocker.patch("jupyter_releaser.npm.extract_dist")
+    get_metadata = mocker.patch(
+        "jupyter_releaser.npm.get_tarball_metadata", wraps=npm.get_tarball_metadata
+    )
+    runner(["check-npm", "--direct-install"])
+    extract_dist.assert_not_called()
+    get_metadata.assert_not_called()
+
+
+def test_check_npm_shards(workspace_package, runner, mocker, npm_registry, git_prep):
+    runner(["build-npm"])
+    runner(["check-npm", "--shards", "2"])
+
+    os.chdir(util.CHECKOUT_NAME)
+    results = npm.check_dist("dist", shards=2)
+    assert sorted(r["name"] for r in results) == ["bar", "baz", "foo"]
+    assert all(r["ok"] for r in results)
+    assert all(r["duration"] >= 0 for r in results)
+
+    # Failures are reported per package
+    text = npm.SMOKE_TEST_SCRIPT.replace(
+        "require(name);", 'require(name + "-missing");'
+    )
+    mocker.patch.object(npm, "SMOKE_TEST_SCRIPT", text)
+    with pytest.raises(ValueError):
+        npm.check_dist("dist", shards=3)
+
+    # Negative shard counts are rejected by the CLI
+    os.chdir("..")
+    with pytest.raises(SystemExit):
+        runner(["check-npm", "--shards", "-1"])
+
+
+def test_check_npm_shards_peer_dependencies(
+    workspace_package, runner, npm_registry, git_prep
+):
+    # Make foo a peer dependency of baz that its shard has to install
+    os.chdir(util.CHECKOUT_NAME)
+    pkg_dir = Path("packages") / "baz"
+    pkg_json = pkg_dir / "package.json"
+    data = json.loads(pkg_json.read_text(encoding="utf-8"))
+    data["peerDependencies"] = data.pop("dependencies")
+    pkg_json.write_text(json.dumps(data), encoding="utf-8")
+    pkg_dir.joinpath("index.js").write_text('require("foo")', encoding="utf-8")
+
+    npm.build_dist(".", "dist")
+    results = npm.check_dist("dist", shards=3)
+    assert all(r["ok"] for r in results)
+
+
+def test_check_npm_cache(
+    workspace_package, runner, mocker, tmp_path, npm_registry, git_prep
+):
+    runner(["build-npm"])
+    cache_dir = tmp_path / "npm-cache"
+    runner(["check-npm", "--npm-cache", cache_dir])
+    installs = os.listdir(cache_dir / "installs")
+    assert len(installs) == 1
+
+    orig_run = util.run
+    called = 0
+
+    def wrapped(cmd, **kwargs):
+        nonlocal called
+        if cmd.startswith("npm install"):
+            called += 1
+        return orig_run(cmd, **kwargs)
+
+    mocker.patch("jupyter_releaser.util.run", wraps=wrapped)
+
+    # A warm run reuses the install without touching the registry
+    requests = len(npm_registry.requests)
+    runner(["check-npm", "--npm-cache", cache_dir])
+    assert called == 0
+    assert len(npm_registry.requests) == requests
+    assert os.listdir(cache_dir / "installs") == installs
+
+    # Installs that have not been used recently are pruned
+    stale = cache_dir / "installs" / "stale"
+    os.makedirs(stale / "node_modules")
+    old = time.time() - npm.INSTALL_CACHE_EXPIRE - 1
+    os.utime(stale, (old, old))
+    runner(["check-npm", "--npm-cache", cache_dir])
+    assert os.listdir(cache_dir / "installs") == installs
+
+    # Upgrading node or npm gets a new install
+    mocker.patch.dict(npm._TOOL_VERSIONS, versions="node v99.0.0, npm 99.0.0")
+    runner(["check-npm", "--npm-cache", cache_dir])
+    assert called == 1
+    assert len(os.listdir(cache_dir / "installs")) == 2
+
+
+def test_extract_dist_npm_streaming(workspace_package, runner, tmp_path, git_prep):
+    runner(["build-npm"])
+    dist_dir = Path(util.CHECKOUT_NAME) / "dist"
+    os.remove(dist_dir / npm.METADATA_NAME)
+
+    target = tmp_path / "staging"
+    names = npm.extract_dist(dist_dir, target)
+    assert sorted(names) == ["bar", "baz", "foo"]
+    assert sorted(os.listdir(target)) == ["bar", "baz", "foo"]
+    for name in names:
+        assert (target / name / "package.json").exists()
+        assert (target / name / "index.js").exists()
+
+
 def test_check_manifest(py_package, runner, git_prep):
     runner(["check-manifest"])
 
 
+def test_check_manifest_sdist(py_package, runner, mocker, build_mock, git_prep):
+    runner(["build-python"])
+
+    orig_run = util.run
+    called = []
+
+    def wrapped(cmd, **kwargs):
+        called.append(cmd)
+        return orig_run(cmd, **kwargs)
+
+    mocker.patch("jupyter_releaser.util.run", wraps=wrapped)
+
+    # The existing sdist is used instead of building new ones
+    result = runner(["check-manifest"])
+    assert "files in version control and sdist match" in result.output
+    assert not [c for c in called if "check-manifest" in c or "build" in c]
+
+    extra = Path(util.CHECKOUT_NAME) / "extra.txt"
+    extra.write_text("hello", encoding="utf-8")
+    run("git add extra.txt", cwd=util.CHECKOUT_NAME)
+    with pytest.raises(ValueError) as e:
+        runner(["check-manifest"])
+    assert "extra.txt" in str(e.value)
+
+
 def test_check_manifest_npm(npm_package, runner, git_prep):
     runner(["check-manifest"])
 
@@ -340,6 +778,29 @@ def test_draft_release_final(npm_dist, runner, mocker, open_mock, git_prep):
     assert len(open_mock.call_args) == 2
 
 
+def test_push_release(py_package, tmp_path_factory):
+    remote = tmp_path_factory.mktemp("remote")
+    run(f"git clone --bare {normalize_path(py_package)} {normalize_path(remote)}")
+    run("git remote remove origin")
+    run(f"git remote add origin {normalize_path(remote)}")
+    run("git fetch origin")
+
+    # A stale tag on a commit that is already on the remote
+    run("git tag stale")
+    run('git commit --allow-empty -m "Publish 0.0.2"')
+    run('git tag v0.0.2 -a -m "Release v0.0.2"')
+    run("git tag foo@0.0.2")
+    run('git commit --allow-empty -m "Bump to 0.0.3.dev0"')
+    util.clear_tag_index()
+
+    lib.push_release("bar")
+    remote_tags = run("git ls-remote --tags origin")
+    assert "refs/tags/v0.0.2" in remote_tags
+    assert "refs/tags/foo@0.0.2" in remote_tags
+    assert "refs/tags/stale" not in remote_tags
+    assert run("git rev-parse HEAD") in run("git ls-remote origin refs/heads/bar")
+
+
 def test_delete_release(npm_dist, runner, mocker, open_mock, git_prep):
     # Publish the release
     # Mimic being on GitHub actions so we get the magic output
@@ -494,6 +955,75 @@ def test_publish_release_npm(npm_dist, runner, mocker, open_mock):
     assert len(open_mock.call_args) == 2
 
 
+def test_publish_npm_dependency_order(
+    workspace_package, runner, mocker, npm_registry, git_prep
+):
+    runner(["build-npm"])
+    dist_dir = Path(util.CHECKOUT_NAME) / "dist"
+    mocker.patch.object(npm, "PUBLISH_BACKOFF", 0)
+
+    levels = npm.get_publish_levels(npm.get_dist_metadata(dist_dir))
+    assert [[info["name"] for info in level] for level in levels] == [
+        ["bar"],
+        ["foo"],
+        ["baz"],
+    ]
+
+    # Transient failures are retried
+    npm_registry.failures["foo"] = 1
+    published = npm.publish_dist(dist_dir)
+    assert published == ["bar", "foo", "baz"]
+    puts = [name for (method, name) in npm_registry.requests if method == "PUT"]
+    assert puts == ["bar", "foo", "foo", "baz"]
+    assert sorted(npm_registry.packages) == ["bar", "baz", "foo"]
+
+    # Existing versions are skipped
+    assert npm.publish_dist(dist_dir) == []
+
+    # Existing versions are looked up in the registry of the publish command
+    registry = os.environ["npm_config_registry"]
+    mocker.patch.dict(os.environ, dict(npm_config_registry="http://127.0.0.1:9/"))
+    assert npm.publish_dist(dist_dir, f"npm publish --registry {registry}") == []
+    assert len([r for r in npm_registry.requests if r[0] == "PUT"]) == 4
+
+    # Dry runs do not look up existing versions
+    requests = len(npm_registry.requests)
+    npm.publish_dist(dist_dir, "npm publish --dry-run")
+    assert len(npm_registry.requests) == requests
+
+
+def test_publish_npm_peer_dependency_order(
+    workspace_package, runner, npm_registry, git_prep, capsys
+):
+    os.chdir(util.CHECKOUT_NAME)
+    pkg_json = Path("packages") / "baz" / "package.json"
+    data = json.loads(pkg_json.read_text(encoding="utf-8"))
+    data["peerDependencies"] = data.pop("dependencies")
+    pkg_json.write_text(json.dumps(data), encoding="utf-8")
+
+    npm.build_dist(".", "dist")
+    levels = npm.get_publish_levels(npm.get_dist_metadata("dist"))
+    assert [[info["name"] for info in level] for level in levels] == [
+        ["bar"],
+        ["foo"],
+        ["baz"],
+    ]
+
+    # Packages in a cycle are published together last
+    pkg_json = Path("packages") / "bar" / "package.json"
+    data = json.loads(pkg_json.read_text(encoding="utf-8"))
+    data["peerDependencies"] = dict(foo="*")
+    pkg_json.write_text(json.dumps(data), encoding="utf-8")
+
+    shutil.rmtree("dist")
+    npm.build_dist(".", "dist")
+    levels = npm.get_publish_levels(npm.get_dist_metadata("dist"))
+    assert [[info["name"] for info in level] for level in levels] == [
+        ["bar", "baz", "foo"],
+    ]
+    assert "circular dependencies" in capsys.readouterr().err
+
+
 def test_config_file(py_package, runner, mocker, git_prep):
     config = Path(util.CHECKOUT_NAME) / util.jupyter_releaser_CONFIG
     config.write_text(TOML_CONFIG, encoding="utf-8")
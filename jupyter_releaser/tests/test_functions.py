@@ -3,11 +3,19 @@
 import json
 import os
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import pytest
+import requests
 import toml
 
 from jupyter_releaser import changelog
+from jupyter_releaser import lib
+from jupyter_releaser import links
+from jupyter_releaser import python
 from jupyter_releaser import util
 from jupyter_releaser.tests import util as testutil
 from jupyter_releaser.util import run
@@ -71,6 +79,72 @@ def test_get_changelog_version_entry(py_package, mocker):
     assert testutil.PR_ENTRY in resp
 
 
+def test_get_changelog_version_entry_local_backport(py_package, mocker, open_mock):
+    version = util.get_version()
+
+    run("git checkout -b main")
+    author = "snuffy <123+snuffy@users.noreply.github.com>"
+    run(f'git commit --allow-empty -m "Original title (#50)" --author "{author}"')
+    sha = run("git rev-parse HEAD")
+    # The owner in a merge subject is the head repo owner, not the PR author
+    run(
+        'git commit --allow-empty -m "Merge pull request #51 from bar/feature" -m "Other title"'
+    )
+    merge_sha = run("git rev-parse HEAD")
+    run("git checkout bar")
+    run(
+        f'git commit --allow-empty -m "Backport PR #50: Original title" -m "(cherry picked from commit {sha})"'
+    )
+    run(
+        f'git commit --allow-empty -m "Backport PR #51: Other title" -m "(cherry picked from commit {merge_sha})"'
+    )
+
+    entry = testutil.CHANGELOG_ENTRY.replace("consideRatio", "meeseeksmachine")
+    entry = entry.replace(
+        "Support git references etc.", "Backport PR #50 on branch bar (Original title)"
+    )
+    entry += "\n* Backport PR #51 on branch bar (Other title) [#52](https://github.com/bar/baz/pull/52) ([@meeseeksmachine](https://github.com/meeseeksmachine))"
+    mocked_gen = mocker.patch("jupyter_releaser.changelog.generate_activity_md")
+    mocked_gen.return_value = entry
+
+    resp = changelog.get_version_entry("bar", "bar/baz", version)
+    assert "Backport PR #50" in resp
+    open_mock.assert_not_called()
+
+    mocked_format = mocker.patch("jupyter_releaser.changelog.format_pr_entry")
+    mocked_format.return_value = testutil.PR_ENTRY
+    resp = changelog.get_version_entry(
+        "bar", "bar/baz", version, resolve_backports=True
+    )
+    expected = "- Original title [#50](https://github.com/bar/baz/pull/50) ([@snuffy](https://github.com/snuffy))"
+    assert expected in resp, resp
+    # The merged PR is fetched since its author is not known locally
+    mocked_format.assert_called_once_with("bar/baz", "51", auth=None)
+    assert "@bar]" not in resp
+
+    # Resolved entries are cached for later runs
+    assert changelog.load_pr_index()["bar/baz"]["50"] == expected
+
+
+def test_tag_index(py_package):
+    index = util.get_tag_index(refresh=True)
+    assert "v0.0.1" in index
+    assert index.merged("bar") == ["v0.0.1"]
+
+    run("git checkout -b baz")
+    run('git commit --allow-empty -m "baz"')
+    util.create_tag("v0.0.2", "Release v0.0.2")
+    assert util.get_tag_index() is index
+    assert "v0.0.2" in index
+    assert index.tags["v0.0.2"]["commit"] == run("git rev-parse HEAD")
+    assert sorted(index.merged("baz")) == ["v0.0.1", "v0.0.2"]
+    assert index.merged("bar") == ["v0.0.1"]
+
+    # The latest tag is the nearest one in the history
+    assert index.latest("baz") == "v0.0.2"
+    assert index.latest("bar") == "v0.0.1"
+
+
 def test_compute_sha256(py_package):
     assert len(util.compute_sha256(py_package / "CHANGELOG.md")) == 64
 
@@ -137,3 +211,217 @@ def test_get_config_file(git_repo):
     config = util.read_config()
     assert config["hooks"]["before-build-python"] == "python setup.py --version"
     assert config["options"]["dist_dir"] == "foo"
+
+
+def test_check_static_wheel(tmp_path):
+    wheel = tmp_path / "foo_bar-0.0.1-py3-none-any.whl"
+    testutil.write_wheel(wheel, "foo-bar", "0.0.1")
+    assert python.check_static(wheel) == "foo-bar"
+
+    # Tampered files and bad long descriptions are caught
+    testutil.write_wheel(
+        wheel, "foo-bar", "0.0.2", description="Title\n=\n\n`broken", tamper=True
+    )
+    with pytest.raises(ValueError) as e:
+        python.check_static(wheel)
+    message = str(e.value)
+    assert "foo_bar/__init__.py does not match its RECORD hash" in message
+    assert 'Metadata version "0.0.2" does not match' in message
+    assert "syntax errors in markup" in message
+
+
+def test_check_static_sdist(tmp_path):
+    sdist = tmp_path / "foo-bar-0.0.1.tar.gz"
+    files = {"PKG-INFO": "Metadata-Version: 2.1\nName: foo_bar\nVersion: 0.0.1\n"}
+    testutil.write_sdist(sdist, "foo-bar-0.0.1", files)
+    assert python.check_static(sdist) == "foo_bar"
+
+    testutil.write_sdist(sdist, "foo-bar-0.0.1", {"setup.py": ""})
+    with pytest.raises(ValueError) as e:
+        python.check_static(sdist)
+    assert "Missing PKG-INFO" in str(e.value)
+
+
+def test_populate_wheelhouse_parallel(tmp_path, mocker):
+    barrier = threading.Barrier(2, timeout=10)
+
+    def fake_run(cmd, **kwargs):
+        # Both populations must be running at once to pass the barrier
+        barrier.wait()
+        wheel_dir = Path(cmd.split("--wheel-dir ")[1].split()[0])
+        reqfile = Path(cmd.split("-r ")[1])
+        name = reqfile.read_text(encoding="utf-8")
+        os.makedirs(wheel_dir)
+        wheel_dir.joinpath(f"{name}-1.0-py3-none-any.whl").write_text("")
+        return ""
+
+    mocker.patch("jupyter_releaser.util.run", side_effect=fake_run)
+    wheelhouse = tmp_path / "wheelhouse"
+
+    def populate(name):
+        return python.populate_wheelhouse(wheelhouse, [name], "python", "key")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(populate, ["foo", "bar"])) == [True, True]
+    wheels = sorted(p.name for p in wheelhouse.iterdir() if p.is_file())
+    assert wheels == ["bar-1.0-py3-none-any.whl", "foo-1.0-py3-none-any.whl"]
+    assert not python.populate_wheelhouse(wheelhouse, ["foo"], "python", "key")
+
+
+def test_check_links(git_repo, link_server, tmp_path):
+    url = link_server.url
+    cache_dir = str(tmp_path / "link-cache")
+    Path("README.md").write_text(
+        f"[ok]({url}/ok) [flaky]({url}/flaky) ![img]({url}/ok) [local](CHANGELOG.md)",
+        encoding="utf-8",
+    )
+    docs = Path("docs")
+    docs.mkdir()
+    docs.joinpath("index.rst").write_text(
+        f"`ok <{url}/ok>`_ and `readme <../README.md>`_\n", encoding="utf-8"
+    )
+    cells = [dict(cell_type="markdown", metadata={}, source=[f"[ok]({url}/ok)"])]
+    notebook = dict(cells=cells, metadata={}, nbformat=4, nbformat_minor=5)
+    docs.joinpath("example.ipynb").write_text(json.dumps(notebook), encoding="utf-8")
+    modules = Path("node_modules") / "foo"
+    modules.mkdir(parents=True)
+    modules.joinpath("README.md").write_text(f"[bad]({url}/missing)", encoding="utf-8")
+
+    # Links are deduplicated and only failures are retried
+    lib.check_links([], [], cache_dir, 600)
+    assert sorted(link_server.requests) == ["flaky", "flaky", "ok"]
+
+    # Links that passed are cached until they expire
+    link_server.requests.clear()
+    lib.check_links([], [], cache_dir, 600)
+    assert link_server.requests == []
+    lib.check_links([], [], cache_dir, 0)
+    assert sorted(link_server.requests) == ["flaky", "ok"]
+
+    Path("FOO.md").write_text(f"[bad]({url}/missing) [bad](BAR.md)", encoding="utf-8")
+    with pytest.raises(ValueError) as e:
+        lib.check_links([], [], cache_dir, 600)
+    assert f"{url}/missing in FOO.md: 404" in str(e.value)
+    assert "BAR.md in FOO.md: No such file" in str(e.value)
+
+    lib.check_links(["FOO.md"], [], cache_dir, 600)
+    lib.check_links([], [f"{url}/missing", "BAR"], cache_dir, 600)
+
+
+def test_fetch_url_rate_limited(link_server):
+    link_server.rate_limits["limited"] = 1
+    session = requests.Session()
+    start = time.time()
+    assert links.fetch_url(session, f"{link_server.url}/limited") is None
+    assert time.time() - start >= 1
+    assert link_server.requests == ["limited", "limited"]
+
+    # Rate limits that outlast the retries are reported
+    link_server.rate_limits["limited"] = links.LINK_RETRIES + 1
+    error = links.fetch_url(session, f"{link_server.url}/limited")
+    assert error.startswith("429")
+
+
+def test_find_link_files(tmp_path):
+    for name in [
+        "README.md",
+        "docs/index.rst",
+        "docs/api/example.ipynb",
+        "docs/api/setup.py",
+        "docs/_build/index.md",
+        ".github/ISSUE.md",
+        "node_modules/foo/README.md",
+        "packages/foo/node_modules/bar/README.md",
+    ]:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("hello", encoding="utf-8")
+
+    files = links.find_files(root=str(tmp_path))
+    files = [Path(f).relative_to(tmp_path).as_posix() for f in files]
+    assert files == [
+        "README.md",
+        "docs/_build/index.md",
+        "docs/api/example.ipynb",
+        "docs/index.rst",
+    ]
+
+    ignored = [str(tmp_path / "docs" / "_build"), str(tmp_path / "README.md")]
+    files = links.find_files(ignored, root=str(tmp_path))
+    files = [Path(f).relative_to(tmp_path).as_posix() for f in files]
+    assert files == ["docs/api/example.ipynb", "docs/index.rst"]
+
+
+def test_check_links_incremental(git_repo, link_server, tmp_path, mocker):
+    url = link_server.url
+    cache_dir = str(tmp_path / "link-cache")
+    Path("a.md").write_text(f"[ok]({url}/ok)", encoding="utf-8")
+    run("git add a.md")
+    run('git commit -m "add docs"')
+    run("git tag v0.0.2")
+    util.clear_tag_index()
+
+    # Files that are not indexed yet are read
+    lib.check_links([], [], cache_dir, 600, incremental=True)
+    assert link_server.requests == ["ok"]
+
+    link_server.requests.clear()
+    lib.check_links([], [], cache_dir, 600, incremental=True)
+    assert link_server.requests == []
+
+    # Links in changed files are checked even if they are cached
+    Path("b.md").write_text(f"[ok]({url}/ok) [other]({url}/other)", encoding="utf-8")
+    get_links = mocker.spy(links, "get_links")
+    lib.check_links([], [], cache_dir, 600, incremental=True)
+    assert sorted(link_server.requests) == ["ok", "other"]
+    assert [c.args[0] for c in get_links.call_args_list] == ["b.md"]
+
+    # Expired links in unchanged files are checked from the index
+    run("git add b.md")
+    run('git commit -m "add more docs"')
+    run("git tag v0.0.3")
+    util.clear_tag_index()
+    link_server.requests.clear()
+    get_links.reset_mock()
+    lib.check_links([], [], cache_dir, 0, incremental=True)
+    assert sorted(link_server.requests) == ["ok", "other"]
+    get_links.assert_not_called()
+
+
+def test_download_files(asset_server, tmp_path):
+    url = asset_server.url
+    for name in ["foo.whl", "bar.tgz", "baz.tar.gz"]:
+        asset_server.assets[name] = os.urandom(3 * 1024 * 1024)
+
+    # Interrupted transfers are resumed with a range request
+    asset_server.drops.add("foo.whl")
+    downloads = [(f"{url}/{name}", tmp_path / name) for name in asset_server.assets]
+    util.download_files(downloads)
+    for name, data in asset_server.assets.items():
+        assert (tmp_path / name).read_bytes() == data
+    assert sorted(os.listdir(tmp_path)) == ["bar.tgz", "baz.tar.gz", "foo.whl"]
+    requests = [r for r in asset_server.requests if r[0] == "foo.whl"]
+    assert len(requests) == 2
+    assert requests[0][1] is None
+    offset = int(requests[1][1].split("=")[1].rstrip("-"))
+    assert 0 < offset <= len(asset_server.assets["foo.whl"]) // 2
+
+    # Slow transfers that are still making progress are not hedged
+    asset_server.requests.clear()
+    asset_server.throttles.add("baz.tar.gz")
+    path = tmp_path / "throttled.tar.gz"
+    util.download_file(f"{url}/baz.tar.gz", path, stall_window=0.25)
+    assert path.read_bytes() == asset_server.assets["baz.tar.gz"]
+    assert len(asset_server.requests) == 1
+
+    # Stalled transfers are hedged with a second request
+    asset_server.requests.clear()
+    asset_server.stalls.add("bar.tgz")
+    path = tmp_path / "hedged.tgz"
+    util.download_file(f"{url}/bar.tgz", path, stall_window=0.5)
+    assert path.read_bytes() == asset_server.assets["bar.tgz"]
+    assert len(asset_server.requests) == 2
+
+    # The stalled request removes its own partial file when it resumes
+    time.sleep(3)
+    assert not list(tmp_path.glob("*.partial"))
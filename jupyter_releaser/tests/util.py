@@ -1,7 +1,12 @@
 # Copyright (c) Jupyter Development Team.
 # Distributed under the terms of the Modified BSD License.
+import base64
+import hashlib
+import io
 import json
 import shutil
+import tarfile
+import zipfile
 from pathlib import Path
 
 from jupyter_releaser import changelog
@@ -151,6 +156,44 @@ def create_npm_package(git_repo):
     return git_repo
 
 
+def write_wheel(path, name, version, description="", tamper=False):
+    """Write a minimal wheel, optionally with a file that fails its RECORD"""
+    module = name.replace("-", "_")
+    info_dir = "-".join(Path(path).name.split("-")[:2]) + ".dist-info"
+    metadata = f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n"
+    if description:
+        metadata += f"Description-Content-Type: text/x-rst\n\n{description}"
+    wheel = "Wheel-Version: 1.0\nRoot-Is-Purelib: true\nTag: py3-none-any\n"
+    files = {
+        f"{module}/__init__.py": "__version__ = '0.0.1'\n",
+        f"{info_dir}/METADATA": metadata,
+        f"{info_dir}/WHEEL": wheel,
+    }
+    record = []
+    for fname, text in files.items():
+        data = text.encode("utf-8")
+        digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=")
+        record.append(f"{fname},sha256={digest.decode('ascii')},{len(data)}")
+    record.append(f"{info_dir}/RECORD,,")
+    files[f"{info_dir}/RECORD"] = "\n".join(record) + "\n"
+    if tamper:
+        files[f"{module}/__init__.py"] = "__version__ = '0.0.2'\n"
+
+    with zipfile.ZipFile(path, "w") as zf:
+        for fname, text in files.items():
+            zf.writestr(fname, text)
+
+
+def write_sdist(path, top, files):
+    """Write a minimal sdist with the given files under a top level folder"""
+    with tarfile.open(path, "w:gz") as tf:
+        for fname, text in files.items():
+            data = text.encode("utf-8")
+            info = tarfile.TarInfo(f"{top}/{fname}")
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+
+
 def create_python_package(git_repo):
     setuppy = git_repo / "setup.py"
     setuppy.write_text(SETUP_PY_TEMPLATE, encoding="utf-8")
@@ -224,6 +267,7 @@ class MockRequestResponse:
     def __init__(self, filename, status_code=200):
         self.filename = filename
         self.status_code = status_code
+        self.headers = dict()
 
     def raise_for_status(self):
         pass
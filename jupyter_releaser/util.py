@@ -10,12 +10,19 @@ import re
 import shlex
 import shutil
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from glob import glob
 from pathlib import Path
 from subprocess import CalledProcessError
 from subprocess import check_output
 from subprocess import PIPE
+from tempfile import TemporaryDirectory
 
+import requests
 import toml
 
 PYPROJECT = Path("pyproject.toml")
@@ -25,8 +32,20 @@ PACKAGE_JSON = Path("package.json")
 jupyter_releaser_CONFIG = Path(".jupyter-releaser.toml")
 
 BUF_SIZE = 65536
+MAX_WORKERS = os.cpu_count() or 1
 TBUMP_CMD = "tbump --non-interactive --only-patch"
 
+# Settings for downloading release assets
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_BACKOFF = 1
+# Start a second request for a download that receives less than
+# DOWNLOAD_MIN_RATE bytes per second over a window of this many seconds
+DOWNLOAD_STALL_WINDOW = 30
+DOWNLOAD_MIN_RATE = 16 * 1024
+
 CHECKOUT_NAME = ".jupyter_releaser_checkout"
 
 RELEASE_HTML_PATTERN = (
@@ -34,6 +53,11 @@ RELEASE_HTML_PATTERN = (
 )
 RELEASE_API_PATTERN = "https://api.github.com/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/releases/tags/(?P<tag>.*)"
 
+# Ref names cannot contain spaces
+TAG_REF_FORMAT = "%(refname:strip=2) %(objectname) %(*objectname) %(creatordate:unix)"
+
+_TAG_INDEXES = dict()
+
 
 def run(cmd, **kwargs):
     """Run a command as a subprocess and get the output as a string"""
@@ -101,6 +125,131 @@ def get_repo():
     return "/".join(parts)
 
 
+class TagIndex:
+    """An index of the git tags in a repository.
+
+    The index is built from a single `git for-each-ref` call and records
+    the target commit and creator date of each tag.  Use `create_tag` to
+    make new tags so that the index stays up to date.
+    """
+
+    def __init__(self, cwd=None):
+        self.cwd = cwd
+        self.tags = dict()
+        self._merged = dict()
+        self.update()
+
+    def __contains__(self, name):
+        return name in self.tags
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def update(self, *names):
+        """Read the given tags (or all tags) from git into the index"""
+        patterns = " ".join(f"refs/tags/{name}" for name in names) or "refs/tags"
+        output = run(
+            f"git for-each-ref --format='{TAG_REF_FORMAT}' {patterns}",
+            cwd=self.cwd,
+            quiet=True,
+        )
+        for line in output.splitlines():
+            name, sha, peeled, date = line.split(" ")
+            if names and name not in names:
+                continue
+            self.tags[name] = dict(sha=sha, commit=peeled or sha, date=int(date or 0))
+        self._merged.clear()
+
+    def merged(self, ref):
+        """Get the names of the tags merged into a ref, newest first"""
+        sha = run(f"git rev-parse {ref}", cwd=self.cwd, quiet=True)
+        if sha not in self._merged:
+            cmd = f"git for-each-ref --format=%(objectname) --merged {sha} refs/tags"
+            output = run(cmd, cwd=self.cwd, quiet=True)
+            self._merged[sha] = set(output.splitlines())
+        merged = self._merged[sha]
+        names = [n for (n, t) in self.tags.items() if t["sha"] in merged]
+        return sorted(names, key=lambda n: (-self.tags[n]["date"], n))
+
+    def latest(self, ref):
+        """Get the most recent tag merged into a ref, or None if there is none"""
+        names = self.merged(ref)
+        if not names:
+            return None
+        date = self.tags[names[0]]["date"]
+        newest = [n for n in names if self.tags[n]["date"] == date]
+        if len(newest) > 1:
+            # Break ties between tags made in the same second using the history
+            commits = " ".join(sorted({self.tags[n]["commit"] for n in newest}))
+            cmd = f"git merge-base --independent {commits}"
+            heads = run(cmd, cwd=self.cwd, quiet=True).split()
+            newest = [n for n in newest if self.tags[n]["commit"] in heads]
+        return newest[0]
+
+    def pointing_at(self, commits):
+        """Get the names of the tags that point at any of the given commits"""
+        commits = set(commits)
+        return sorted(n for (n, t) in self.tags.items() if t["commit"] in commits)
+
+
+def get_tag_index(refresh=False):
+    """Get the shared tag index for the current working directory"""
+    key = os.getcwd()
+    if refresh or key not in _TAG_INDEXES:
+        _TAG_INDEXES[key] = TagIndex()
+    return _TAG_INDEXES[key]
+
+
+def clear_tag_index():
+    """Clear the cached tag indexes, e.g. after fetching tags"""
+    _TAG_INDEXES.clear()
+
+
+def create_tag(name, message=None):
+    """Create a git tag and add it to the tag index"""
+    if message:
+        run(f'git tag {name} -a -m "{message}"')
+    else:
+        run(f"git tag {name}")
+    get_tag_index().update(name)
+
+
+def create_tags(names, message="Release {tag_name}"):
+    """Create annotated git tags on HEAD in a single transaction.
+
+    The tag objects are written with one `git hash-object` call and the
+    refs are created with one `git update-ref --stdin` call, so the number
+    of processes does not depend on the number of tags.
+    """
+    names = list(names)
+    if not names:
+        return
+
+    sha = run("git rev-parse HEAD", quiet=True)
+    tagger = run("git var GIT_COMMITTER_IDENT", quiet=True)
+
+    with TemporaryDirectory() as td:
+        paths = []
+        for (i, name) in enumerate(names):
+            path = osp.join(td, str(i))
+            text = f"object {sha}\ntype commit\ntag {name}\ntagger {tagger}\n\n"
+            text += message.format(tag_name=name) + "\n"
+            Path(path).write_text(text, encoding="utf-8")
+            paths.append(path)
+        stdin = "\n".join(paths) + "\n"
+        output = run(
+            "git hash-object -t tag -w --stdin-paths", input=stdin.encode("utf-8")
+        )
+
+    shas = output.splitlines()
+    stdin = "".join(f"create refs/tags/{n} {s}\n" for (n, s) in zip(names, shas))
+    run("git update-ref --stdin", input=stdin.encode("utf-8"))
+    get_tag_index().update(*names)
+
+
 def get_version():
     """Get the current package version"""
     if SETUP_PY.exists():
@@ -116,6 +265,175 @@ def normalize_path(path):
     return str(path).replace(os.sep, "/")
 
 
+def download_files(downloads, headers=None):
+    """Download (url, path) pairs in parallel"""
+    downloads = list(downloads)
+    if not downloads:
+        return
+
+    def download(item):
+        url, path = item
+        log(f"Fetching {Path(path).name}...")
+        download_file(url, path, headers=headers)
+
+    workers = min(DOWNLOAD_WORKERS, len(downloads))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(download, downloads))
+
+
+def download_file(url, path, headers=None, stall_window=None):
+    """Download a file to a path, resuming interrupted transfers.
+
+    Data is written to a temporary file that is moved into place when
+    complete.  If the download receives less than `DOWNLOAD_MIN_RATE` bytes
+    per second over `stall_window` seconds, a second request is started and
+    the first to finish is used.
+    """
+    path = Path(path)
+    if stall_window is None:
+        stall_window = DOWNLOAD_STALL_WINDOW
+    state = dict(
+        done=threading.Event(), lock=threading.Lock(), received=0, active=set()
+    )
+    partials = [
+        path.with_name(f"{path.name}.partial"),
+        path.with_name(f"{path.name}.hedge.partial"),
+    ]
+
+    executor = ThreadPoolExecutor(max_workers=len(partials))
+    futures = [executor.submit(_download, url, partials[0], headers, state)]
+    while True:
+        received = state["received"]
+        finished, _ = wait(futures, timeout=stall_window)
+        if finished:
+            break
+        rate = (state["received"] - received) / stall_window
+        if rate < DOWNLOAD_MIN_RATE:
+            log(f"Hedging stalled download of {path.name} ({rate:.0f} bytes/s)")
+            futures.append(executor.submit(_download, url, partials[1], headers, state))
+            break
+
+    result = None
+    error = None
+    pending = set(futures)
+    while pending and result is None:
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            try:
+                result = result or future.result()
+            except Exception as e:
+                error = error or e
+
+    # Stop any other request, without waiting for it.  Requests that are
+    # still running remove their own partial file when they stop.
+    with state["lock"]:
+        state["done"].set()
+        running = set(state["active"])
+    executor.shutdown(wait=False)
+    if result is None:
+        raise error
+
+    os.replace(result, path)
+    for partial in partials:
+        if partial in running:
+            continue
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+
+
+def _download(url, partial, headers, state):
+    """Download a url to a partial file, resuming with Range requests.
+
+    Returns the partial file when complete, or None if another request
+    finished first, in which case the partial file is removed.
+    """
+    with state["lock"]:
+        state["active"].add(partial)
+    result = None
+    try:
+        result = _download_partial(url, partial, headers, state)
+    finally:
+        with state["lock"]:
+            state["active"].discard(partial)
+            if state["done"].is_set():
+                result = None
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+    return result
+
+
+def _download_partial(url, partial, headers, state):
+    """Download a url to a partial file with retries, until it is complete
+    or the download is done.
+    """
+    done = state["done"]
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        if done.is_set():
+            return None
+        offset = partial.stat().st_size if partial.exists() else 0
+        request_headers = dict(headers or {})
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+        try:
+            with requests.get(
+                url, headers=request_headers, stream=True, timeout=DOWNLOAD_TIMEOUT
+            ) as r:
+                if r.status_code == 416 and offset:
+                    # The partial file may already be complete
+                    content_range = r.headers.get("Content-Range", "")
+                    if content_range == f"bytes */{offset}":
+                        return partial
+                    os.remove(partial)
+                    continue
+                r.raise_for_status()
+
+                total = None
+                if r.status_code == 206:
+                    total = int(r.headers["Content-Range"].split("/")[-1])
+                else:
+                    # The server sent the whole file
+                    offset = 0
+                    if "Content-Length" in r.headers:
+                        total = int(r.headers["Content-Length"])
+
+                if done.is_set():
+                    return None
+                with open(partial, "ab" if offset else "wb") as f:
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if done.is_set():
+                            return None
+                        f.write(chunk)
+                        state["received"] += len(chunk)
+
+            size = partial.stat().st_size
+            if total is not None and size != total:
+                msg = f"Incomplete download ({size} of {total} bytes)"
+                raise requests.ConnectionError(msg)
+            return partial
+
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as e:
+            error = e
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code < 500:
+                raise
+            error = e
+
+        if attempt < DOWNLOAD_RETRIES:
+            log(f"Resuming download of {partial.name} after error: {error}")
+            done.wait(DOWNLOAD_BACKOFF * 2 ** attempt)
+    if done.is_set():
+        return None
+    raise error
+
+
 def compute_sha256(path):
     """Compute the sha256 of a file"""
     sha256 = hashlib.sha256()